@@ -8,4 +8,5 @@ print("Current working directory: {0}".format(os.getcwd()))
 
 
 
-msu_pc_data, msu_ai_data = process_repo("montana_state_university")
+# Only the lines mentioning the IR are parsed from each monthly file
+msu_pc_data, msu_ai_data = process_repo("montana_state_university", prefilter=True)
@@ -1,9 +1,388 @@
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 from zipfile import ZipFile
 import glob
+import os
+import io
+import json
+import hashlib
+import re
+from fnmatch import fnmatch
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from queue import Queue, Full
+from threading import Thread, Event
+
+
+# Column names and types of the three RAMP file families: "all" is the data
+# harvested before August 19, 2018 ("v1"); "page-clicks" and "country-device-info"
+# are the page click and access info data harvested since then ("v2"). Columns
+# are listed in file order. Columns typed "date" are parsed as dates.
+RAMP_SCHEMAS = {
+    "all": {"citableContent": "category", "clickThrough": "float32", "clicks": "int32",
+            "country": "category", "date": "date", "device": "category", "impressions": "int32",
+            "index": "category", "position": "float32", "url": "object", "repository_id": "category"},
+    "page-clicks": {"citableContent": "category", "clickThrough": "float32", "clicks": "int32",
+                    "date": "date", "impressions": "int32", "index": "category", "position": "float32",
+                    "url": "object", "repository_id": "category"},
+    "country-device-info": {"clickThrough": "float32", "clicks": "int32", "country": "category",
+                            "date": "date", "device": "category", "impressions": "int32",
+                            "index": "category", "position": "float32", "repository_id": "category"}
+}
+
+# File name patterns of the zipped monthly files of each RAMP file family.
+RAMP_FILE_PATTERNS = {
+    "all": "*all.zip",
+    "page-clicks": "*all_page-clicks.zip",
+    "country-device-info": "*all_country-device-info.zip"
+}
+
+# Rollups materialized from each monthly file by rollup_ramp_file: the key
+# columns of each rollup, where "month" is derived from the date. The measures
+# are summed over the rows of each key, and the rows are counted.
+RAMP_ROLLUPS = {
+    "daily": ["date", "repository_id"],
+    "daily_country_device": ["date", "repository_id", "country", "device"],
+    "monthly_url": ["month", "repository_id", "url", "citableContent"]
+}
+RAMP_ROLLUP_MEASURES = ["clicks", "impressions", "position"]
+
+# Column names and types of the per-IR daily clicksums written by
+# get_per_ir_daily_clicks, for page click ("pc") and access info ("ai") data.
+DAILY_CLICKS_SCHEMAS = {
+    "pc": {"date": "date", "clicks": "int64", "repository_id": "object"},
+    "ai": {"date": "date", "country": "object", "device": "object", "clicks": "int64",
+           "repository_id": "object"}
+}
+
+# The strings that read_csv reads as missing values by default. read_arrow_csv
+# passes them to pyarrow so that both engines read missing values the same way.
+PANDAS_NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+                    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+
+
+def get_ramp_family(zip_file):
+    """Identifies which RAMP file family a monthly zip file belongs to, based on
+    the file naming convention used in the ramp_zipped directory.
 
+    :param zip_file:
+        A zip file containing a CSV of RAMP data.
+
+    :return family:
+        The key of the file's schema in RAMP_SCHEMAS, or None if the file name
+        is not recognized.
+    """
+    for family, pattern in RAMP_FILE_PATTERNS.items():
+        if fnmatch(os.path.basename(zip_file), pattern):
+            return family
+    return None
+
+
+def get_ramp_month(zip_file):
+    """Identifies the month of a zipped monthly RAMP data file from a YYYY-MM
+    date in its file name.
+
+    :param zip_file:
+        A zip file containing a CSV of RAMP data.
+
+    :return month:
+        A pandas Period for the month, or None if the file name has no date.
+    """
+    match = re.search(r"(\d{4})-(\d{2})", os.path.basename(zip_file))
+    if match is None:
+        return None
+    return pd.Period(year=int(match.group(1)), month=int(match.group(2)), freq="M")
+
+
+def month_in_range(month, start=None, end=None):
+    """Checks whether a month overlaps a date range.
+
+    :param month:
+        A pandas Period with monthly frequency.
+
+    :param start:
+        Optional. The first date of the range. The range is open-ended if None.
+
+    :param end:
+        Optional. The last date of the range. The range is open-ended if None.
+
+    :return in_range:
+        True if any day of the month lies within the range.
+    """
+    if start is not None and month.end_time < pd.Timestamp(start):
+        return False
+    if end is not None and month.start_time > pd.Timestamp(end):
+        return False
+    return True
+
+
+def list_ramp_files(family, start=None, end=None, ramp_dir="./ramp_zipped"):
+    """Lists the zipped monthly RAMP data files of one file family, in month order.
+    Files whose month lies entirely outside of the start and end dates are left
+    out. Files without a date in their name are always included.
+
+    :param family:
+        A RAMP file family, i.e. a key of RAMP_FILE_PATTERNS.
+
+    :param start:
+        Optional. The first date of interest, as a string or datetime.
+
+    :param end:
+        Optional. The last date of interest, as a string or datetime.
+
+    :param ramp_dir:
+        The directory containing the zipped files, in one subdirectory per year.
+
+    :return file_list:
+        A sorted list of file paths.
+    """
+    file_list = []
+    for zip_file in sorted(glob.glob(os.path.join(ramp_dir, "*", RAMP_FILE_PATTERNS[family]))):
+        month = get_ramp_month(zip_file)
+        if month is not None and not month_in_range(month, start, end):
+            continue
+        file_list.append(zip_file)
+    return file_list
+
+
+def concat_frames(frames, cols=None):
+    """Concatenates a list of dataframes in a single step. Collecting the parts of
+    a result in a list and concatenating them once takes time proportional to the
+    size of the result, where growing a dataframe by appending to it in a loop
+    copies everything accumulated so far on each iteration.
+
+    :param frames:
+        A list (or other iterable) of pandas dataframes.
+
+    :param cols:
+        Column names of the empty dataframe returned if there are no frames.
+
+    :return combined:
+        A pandas dataframe containing the rows of all frames, in order.
+    """
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame(columns=cols)
+    return pd.concat(frames)
+
+
+def sum_clicks_by(ramp_df, keys):
+    """Sums clicks per combination of key values in one vectorized grouped sum,
+    instead of iterating over the groups. Rows with a missing key are dropped,
+    and only observed combinations of categorical keys are returned, as plain
+    values rather than categories.
+
+    :param ramp_df:
+        A pandas dataframe with the key columns and a clicks column.
+
+    :param keys:
+        A list of key column names, e.g. ["date", "country", "device"].
+
+    :return clicks:
+        A pandas dataframe with the key columns and the int64 clicksum of each
+        combination, sorted by the keys.
+    """
+    clicks = ramp_df.groupby(keys, observed=True, sort=True)["clicks"].sum().astype("int64").reset_index()
+    for key in keys:
+        if isinstance(clicks[key].dtype, pd.CategoricalDtype):
+            clicks[key] = clicks[key].astype(clicks[key].cat.categories.dtype)
+    return clicks
+
+
+def combine_click_sums(partials, keys):
+    """Merges partial clicksums, e.g. those of several monthly files, by summing
+    the clicks of equal keys. The combine is associative and commutative: the
+    result is sorted by the keys and integer sums are exact, so partials can be
+    merged in any order or grouping, e.g. as workers finish, with the same result.
+
+    :param partials:
+        An iterable of pandas dataframes with the key columns and clicks, e.g.
+        from sum_clicks_by or extract_daily_pc_clicks.
+
+    :param keys:
+        A list of key column names.
+
+    :return clicks:
+        A pandas dataframe with the key columns and the total clicks per key,
+        sorted by the keys. See sum_clicks_by.
+    """
+    return sum_clicks_by(concat_frames(partials, keys + ["clicks"]), keys)
+
+
+def read_arrow_csv(ramp_file, family=None, columns=None):
+    """Reads a CSV of RAMP data with the multithreaded CSV reader of the pyarrow
+    package, using the column types declared in RAMP_SCHEMAS, and converts the
+    result to pandas once parsing is complete. See read_ramp_csv.
+
+    :param ramp_file:
+        A file path or file-like object, e.g. an open zip file member.
+
+    :param family:
+        The RAMP file family. If None, column types are inferred by pyarrow.
 
-def extract_daily_pc_clicks(zip_file):
+    :param columns:
+        A list of column names to be parsed, in file order. All columns are
+        parsed if None.
+
+    :return ramp_df:
+        A pandas dataframe.
+    """
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    arrow_types = {"category": pa.dictionary(pa.int32(), pa.string()), "int32": pa.int32(),
+                   "float32": pa.float32(), "object": pa.string(), "date": pa.timestamp("ns")}
+    column_types = {}
+    if family is not None:
+        schema = RAMP_SCHEMAS[family]
+        column_types = {col: arrow_types[schema[col]] for col in (columns or schema)}
+    # Missing values are read as pandas reads them, e.g. empty fields and "NA"
+    convert_options = pa_csv.ConvertOptions(include_columns=columns, column_types=column_types,
+                                            strings_can_be_null=True, null_values=PANDAS_NA_VALUES)
+    ramp_table = pa_csv.read_csv(ramp_file, read_options=pa_csv.ReadOptions(use_threads=True),
+                                 convert_options=convert_options)
+    ramp_df = ramp_table.to_pandas()
+    # Arrow keeps categories in order of appearance, pandas sorts them
+    for col in ramp_df.select_dtypes("category").columns:
+        ramp_df[col] = ramp_df[col].cat.reorder_categories(sorted(ramp_df[col].cat.categories))
+    return ramp_df
+
+
+def read_ramp_csv(ramp_file, family=None, columns=None, chunksize=None, engine=None):
+    """Reads a CSV of RAMP data using the column types declared in RAMP_SCHEMAS,
+    parsing only the requested columns.
+
+    :param ramp_file:
+        A file path or file-like object, e.g. an open zip file member.
+
+    :param family:
+        The RAMP file family, as returned by get_ramp_family. If None, all
+        columns are parsed with the default pandas types.
+
+    :param columns:
+        A list of column names to be parsed. All columns are parsed if None.
+
+    :param chunksize:
+        If provided, an iterator of dataframes with this many rows each is returned.
+
+    :param engine:
+        If "pyarrow", the CSV is parsed by the multithreaded pyarrow CSV reader
+        (see read_arrow_csv), which does not support chunksize. The single-threaded
+        pandas parser is used if None.
+
+    :return ramp_df:
+        A pandas dataframe, or an iterator of dataframes if chunksize is provided.
+    """
+    if family is not None and columns is not None:
+        # Keep columns in file order, as the pandas parser does
+        columns = [col for col in RAMP_SCHEMAS[family] if col in columns]
+    if engine == "pyarrow":
+        if chunksize is not None:
+            raise ValueError("chunksize is not supported with the pyarrow engine")
+        return read_arrow_csv(ramp_file, family, columns)
+    if family is None:
+        return pd.read_csv(ramp_file, usecols=columns, chunksize=chunksize)
+    schema = RAMP_SCHEMAS[family]
+    if columns is None:
+        columns = list(schema)
+    dtypes = {col: schema[col] for col in columns if schema[col] != "date"}
+    date_cols = [col for col in columns if schema[col] == "date"]
+    return pd.read_csv(ramp_file, usecols=columns, dtype=dtypes, parse_dates=date_cols,
+                       chunksize=chunksize)
+
+
+@contextmanager
+def open_ramp_file(zip_file, rampfile=None):
+    """Opens the CSV file in a zipped monthly RAMP data file, or passes through a
+    file object holding its contents that was already read, e.g. by
+    prefetch_ramp_files.
+
+    :param zip_file:
+        A path to a zipped monthly RAMP data file.
+
+    :param rampfile:
+        Optional. A file object with the unzipped contents of zip_file.
+
+    :return rampfile:
+        A binary file object positioned at the start of the CSV data.
+    """
+    if rampfile is not None:
+        yield rampfile
+        return
+    with ZipFile(zip_file) as rampzip:
+        with rampzip.open(rampzip.namelist()[0]) as rampfile:
+            yield rampfile
+
+
+def read_ramp_member(zip_file):
+    """Reads and inflates the CSV file in a zipped monthly RAMP data file.
+
+    :param zip_file:
+        A path to a zipped monthly RAMP data file.
+
+    :return rampfile:
+        A BytesIO object with the unzipped CSV data.
+    """
+    with ZipFile(zip_file) as rampzip:
+        return io.BytesIO(rampzip.read(rampzip.namelist()[0]))
+
+
+def prefetch_ramp_files(file_list, depth=2):
+    """Reads and inflates zipped monthly RAMP data files on a background thread,
+    so that the next files are read from disk and decompressed while the current
+    one is being parsed and aggregated.
+
+    :param file_list:
+        A list of paths to zipped monthly RAMP data files.
+
+    :param depth:
+        The number of inflated files that may wait to be processed. Memory use is
+        bounded by about depth + 2 unzipped monthly files.
+
+    :return files:
+        A generator of (zip_file, rampfile) tuples in file_list order, where
+        rampfile is a BytesIO object with the unzipped CSV data. Errors raised
+        while reading a file are raised by the generator in its place.
+    """
+    buffer = Queue(maxsize=depth)
+    stop = Event()
+
+    def put(item):
+        # Give up if the consumer has stopped iterating
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def read_files():
+        for zip_file in file_list:
+            try:
+                item = (zip_file, read_ramp_member(zip_file), None)
+            except Exception as e:
+                put((zip_file, None, e))
+                return
+            if not put(item):
+                return
+
+    reader = Thread(target=read_files, daemon=True)
+    reader.start()
+    try:
+        for _ in file_list:
+            zip_file, rampfile, error = buffer.get()
+            if error is not None:
+                raise error
+            yield zip_file, rampfile
+    finally:
+        stop.set()
+        reader.join()
+
+
+def extract_daily_pc_clicks(zip_file, engine=None, rampfile=None):
     """Function for processing zip files to conserve memory and space. Reads in a
     file of RAMP CSV data and subsets to two columns, date and clicks. Used for
     global RAMP data - does not filter on specific IR.
@@ -11,19 +390,25 @@ def extract_daily_pc_clicks(zip_file):
     :param zip_file:
         A zip file containing a CSV of RAMP data.
 
+    :param engine:
+        The CSV parser to be used. See read_ramp_csv.
+
+    :param rampfile:
+        Optional. A file object with the unzipped contents of zip_file, e.g. from
+        prefetch_ramp_files. The zip file is opened if not provided.
+
     :return daily_clicks:
         A pandas dataframe subset to date and clicks columns.
     """
-    with ZipFile(zip_file) as rampzip:
-        with rampzip.open(rampzip.namelist()[0]) as rampfile:
-            ramp_df = pd.read_csv(rampfile)
-    daily_clicks = pd.DataFrame(columns=["date", "clicks"])
-    for name, group in ramp_df.groupby("date"):
-        daily_clicks = daily_clicks.append(pd.DataFrame([[name, group["clicks"].sum()]], columns=["date", "clicks"]))
+    with open_ramp_file(zip_file, rampfile) as rampfile:
+        ramp_df = read_ramp_csv(rampfile, get_ramp_family(zip_file), ["clicks", "date"],
+                                engine=engine)
+    daily_clicks = sum_clicks_by(ramp_df, ["date"])
+    daily_clicks["date"] = pd.to_datetime(daily_clicks["date"])
     return daily_clicks
 
 
-def extract_daily_ai_clicks(zip_file):
+def extract_daily_ai_clicks(zip_file, engine=None, rampfile=None):
     """Function for processing zip files to conserve memory and space. Reads in a
     file of RAMP CSV data and subsets to four columns, date, country, device. and clicks.
     Used for global RAMP data - does not filter on specific IR.
@@ -31,21 +416,402 @@ def extract_daily_ai_clicks(zip_file):
     :param zip_file:
         A zip file containing a CSV of RAMP data.
 
+    :param engine:
+        The CSV parser to be used. See read_ramp_csv.
+
+    :param rampfile:
+        Optional. A file object with the unzipped contents of zip_file, e.g. from
+        prefetch_ramp_files. The zip file is opened if not provided.
+
     :return daily_clicks:
         A pandas dataframe subset to date, country, device. and clicks columns.
     """
-    with ZipFile(zip_file) as rampzip:
-        with rampzip.open(rampzip.namelist()[0]) as rampfile:
-            ramp_df = pd.read_csv(rampfile)
     cols = ["date", "country", "device", "clicks"]
-    daily_clicks = pd.DataFrame(columns=cols)
-    for name, group in ramp_df.groupby(["date", "country", "device"]):
-        daily_clicks = daily_clicks.append(pd.DataFrame([[name[0], name[1], name[2], group["clicks"].sum()]],
-                                                        columns=cols))
+    with open_ramp_file(zip_file, rampfile) as rampfile:
+        ramp_df = read_ramp_csv(rampfile, get_ramp_family(zip_file), cols, engine=engine)
+    daily_clicks = sum_clicks_by(ramp_df, ["date", "country", "device"])
+    daily_clicks["date"] = pd.to_datetime(daily_clicks["date"])
     return daily_clicks
 
 
-def extract_subset_ramp_data(zip_file, ir_repo_id):
+def load_url_dictionary(dict_file):
+    """Loads a URL dictionary, which assigns each distinct URL in the RAMP data a
+    compact integer id, shared by all months and repositories. An empty
+    dictionary is returned if the file does not exist yet.
+
+    :param dict_file:
+        A path to a CSV file written by save_url_dictionary.
+
+    :return url_dictionary:
+        A pandas Index of URLs, where the position of each URL is its id.
+    """
+    if not os.path.exists(dict_file):
+        return pd.Index([], dtype=object)
+    urls = pd.read_csv(dict_file, dtype=str, keep_default_na=False)["url"]
+    return pd.Index(urls.to_numpy(dtype=object))
+
+
+def save_url_dictionary(url_dictionary, dict_file):
+    """Saves a URL dictionary. URLs are only ever appended to a dictionary, so ids
+    saved with earlier data stay valid.
+
+    :param url_dictionary:
+        A pandas Index of URLs, see load_url_dictionary.
+
+    :param dict_file:
+        A path to the CSV file to write.
+
+    :return:
+        None
+    """
+    pd.DataFrame({"url": url_dictionary}).to_csv(dict_file + ".tmp", index=False)
+    os.replace(dict_file + ".tmp", dict_file)
+    return
+
+
+def encode_urls(urls, url_dictionary):
+    """Replaces URLs with their ids in a URL dictionary. URLs that are not in the
+    dictionary yet are added to it.
+
+    :param urls:
+        A pandas Series of URLs, e.g. the url column of a month of RAMP data.
+
+    :param url_dictionary:
+        A pandas Index of URLs, see load_url_dictionary.
+
+    :return url_ids, url_dictionary:
+        An int32 Series of URL ids with the index of urls, where missing URLs
+        are -1, and the dictionary with any new URLs appended.
+    """
+    # Each distinct URL is only looked up once
+    codes, uniques = pd.factorize(urls)
+    ids = url_dictionary.get_indexer(uniques)
+    new = ids == -1
+    if new.any():
+        ids[new] = np.arange(len(url_dictionary), len(url_dictionary) + new.sum())
+        url_dictionary = url_dictionary.append(pd.Index(uniques[new], dtype=object))
+    url_ids = np.append(ids, -1).astype("int32")[codes]
+    return pd.Series(url_ids, index=urls.index, name=urls.name), url_dictionary
+
+
+def decode_urls(url_ids, url_dictionary):
+    """Replaces URL ids with the URLs in a URL dictionary.
+
+    :param url_ids:
+        A pandas Series of URL ids, see encode_urls.
+
+    :param url_dictionary:
+        A pandas Index of URLs, see load_url_dictionary.
+
+    :return urls:
+        A Series of URLs with the index of url_ids. Ids of -1 become NaN.
+    """
+    urls = url_dictionary.take(url_ids.to_numpy(), allow_fill=True, fill_value=np.nan)
+    return pd.Series(urls, index=url_ids.index, name=url_ids.name)
+
+
+def hash_file(file_path, block_size=1048576):
+    """Computes the SHA-256 hash of a file's contents, reading it in blocks.
+
+    :param file_path:
+        A path to the file to be hashed.
+
+    :param block_size:
+        Number of bytes read at a time.
+
+    :return digest:
+        The hexadecimal SHA-256 digest of the file.
+    """
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def load_manifest(manifest_file):
+    """Loads an ingest manifest, which records the zipped monthly files that have
+    been processed into each output. An empty manifest is returned if the file
+    does not exist yet.
+
+    :param manifest_file:
+        A path to a JSON manifest file.
+
+    :return manifest:
+        A dictionary with a "files" entry, mapping file paths to their size,
+        modification time and SHA-256 hash, and an "outputs" entry, mapping
+        output names to the files ingested into them and any related state.
+    """
+    if not os.path.exists(manifest_file):
+        return {"files": {}, "outputs": {}}
+    with open(manifest_file) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_file):
+    """Saves an ingest manifest. The file is written to a temporary file first and
+    then renamed, so an interrupted save leaves the previous manifest intact.
+
+    :param manifest:
+        A manifest dictionary, see load_manifest.
+
+    :param manifest_file:
+        A path to a JSON manifest file.
+
+    :return:
+        None
+    """
+    with open(manifest_file + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(manifest_file + ".tmp", manifest_file)
+    return
+
+
+def get_changed_files(file_list, manifest, output):
+    """Finds the files in a list that are new or have changed since they were last
+    ingested into an output. The manifest's file records are refreshed first;
+    files are only re-hashed if their size or modification time has changed.
+
+    :param file_list:
+        A list of paths to zipped monthly RAMP data files.
+
+    :param manifest:
+        A manifest dictionary, see load_manifest. Updated in place.
+
+    :param output:
+        The name of the output, e.g. "global_daily_clicks".
+
+    :return changed_files:
+        A list of the new or changed files, in file_list order.
+    """
+    for zip_file in file_list:
+        stat = os.stat(zip_file)
+        record = manifest["files"].get(zip_file)
+        if record is None or record["size"] != stat.st_size or record["mtime"] != stat.st_mtime:
+            manifest["files"][zip_file] = {"size": stat.st_size, "mtime": stat.st_mtime,
+                                           "sha256": hash_file(zip_file)}
+    ingested = manifest["outputs"].get(output, {})
+    return [zip_file for zip_file in file_list if zip_file not in ingested
+            or ingested[zip_file]["sha256"] != manifest["files"][zip_file]["sha256"]]
+
+
+def get_removed_files(file_list, manifest, output):
+    """Finds the files that were ingested into an output but are no longer in a list.
+
+    :param file_list:
+        A list of paths to the zipped monthly RAMP data files that currently exist.
+
+    :param manifest:
+        A manifest dictionary, see load_manifest.
+
+    :param output:
+        The name of the output.
+
+    :return removed_files:
+        A sorted list of files that were ingested but are missing from file_list.
+    """
+    ingested = manifest["outputs"].get(output, {})
+    return sorted(set(ingested) - set(file_list))
+
+
+def record_ingested_file(manifest, output, zip_file, **state):
+    """Records in a manifest that a file has been ingested into an output, along
+    with its current hash and any output specific state.
+
+    :param manifest:
+        A manifest dictionary, see load_manifest. Updated in place.
+
+    :param output:
+        The name of the output.
+
+    :param zip_file:
+        The path of the ingested file. Its record must be in manifest["files"].
+
+    :param state:
+        Keyword arguments saved with the record, e.g. repos=[...].
+
+    :return:
+        None
+    """
+    record = {"sha256": manifest["files"][zip_file]["sha256"]}
+    record.update(state)
+    manifest["outputs"].setdefault(output, {})[zip_file] = record
+    return
+
+
+def load_checkpoint(checkpoint_file):
+    """Loads the units of work recorded as finished in a checkpoint file by
+    record_checkpoint. An empty set is returned if the file does not exist yet.
+
+    :param checkpoint_file:
+        A path to a checkpoint file.
+
+    :return finished:
+        A set of tuples of strings, e.g. ("boston_university", "pc").
+    """
+    if not os.path.exists(checkpoint_file):
+        return set()
+    with open(checkpoint_file) as f:
+        lines = f.read().split("\n")
+    # The last line is empty, or incomplete if the job stopped while writing it
+    return set(tuple(line.split("\t")) for line in lines[:-1])
+
+
+def record_checkpoint(checkpoint_file, *unit):
+    """Records a unit of work as finished by appending one line to a checkpoint
+    file. The line is flushed to disk before returning, and a partly written
+    line is ignored by load_checkpoint.
+
+    :param checkpoint_file:
+        A path to a checkpoint file.
+
+    :param unit:
+        Strings identifying the unit of work, e.g. "boston_university", "pc".
+
+    :return:
+        None
+    """
+    with open(checkpoint_file, "a") as f:
+        f.write("\t".join(unit) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return
+
+
+def write_csv_atomic(df, out_file):
+    """Writes a dataframe to a CSV file without the index. The data are written to
+    a temporary file which is then renamed, so the output file is either the old
+    version or the complete new one, never a partial write.
+
+    :param df:
+        A Pandas dataframe.
+
+    :param out_file:
+        A path to the output CSV file.
+
+    :return:
+        None
+    """
+    df.to_csv(out_file + ".tmp", index=False)
+    os.replace(out_file + ".tmp", out_file)
+    return
+
+
+def cache_ramp_file(zip_file, cache_dir, row_group_size=100000):
+    """This function converts a zipped RAMP monthly data file into a Parquet
+       file, so that the CSV only has to be decompressed and parsed once. Rows
+       are sorted by repository_id, so that the statistics of each row group
+       can be used to skip row groups when reading a single repository's data.
+       The cache is keyed by the size, modification time and SHA-256 hash of
+       the zip file, and is only rebuilt if the zip file has changed. Requires
+       the pyarrow package.
+
+    Parameters
+    ----------
+
+    zip_file:
+        String. A file path pointing to a zip file.
+
+    cache_dir:
+        String. The directory where cached Parquet files and their keys are saved.
+
+    row_group_size:
+        Integer. The maximum number of rows per Parquet row group.
+
+    Returns
+    -------
+
+    cache_file:
+        String. The path of the Parquet file containing the monthly data.
+
+    """
+    stem = os.path.splitext(os.path.basename(zip_file))[0]
+    cache_file = os.path.join(cache_dir, stem + ".parquet")
+    key_file = os.path.join(cache_dir, stem + ".json")
+    stat = os.stat(zip_file)
+    if os.path.exists(cache_file) and os.path.exists(key_file):
+        with open(key_file) as f:
+            key = json.load(f)
+        if key["size"] == stat.st_size and key["mtime"] == stat.st_mtime:
+            return cache_file
+        # A new modification time alone does not mean the contents changed
+        if key["size"] == stat.st_size and key["sha256"] == hash_file(zip_file):
+            key["mtime"] = stat.st_mtime
+            with open(key_file, "w") as f:
+                json.dump(key, f)
+            return cache_file
+    with ZipFile(zip_file) as rampzip:
+        with rampzip.open(rampzip.namelist()[0]) as rampfile:
+            ramp_df = read_ramp_csv(rampfile, get_ramp_family(zip_file))
+    # Plain strings keep min/max statistics usable for row group filtering
+    ramp_df["repository_id"] = ramp_df["repository_id"].astype(str)
+    ramp_df = ramp_df.sort_values("repository_id", kind="stable")
+    os.makedirs(cache_dir, exist_ok=True)
+    ramp_df.to_parquet(cache_file + ".tmp", index=False, row_group_size=row_group_size)
+    os.replace(cache_file + ".tmp", cache_file)
+    key = {"source": zip_file, "size": stat.st_size, "mtime": stat.st_mtime,
+           "sha256": hash_file(zip_file)}
+    with open(key_file, "w") as f:
+        json.dump(key, f)
+    return cache_file
+
+
+def cache_ramp_data(file_list, cache_dir):
+    """This function converts a list of zipped RAMP data files to Parquet. Files
+       with a current cache are skipped. See cache_ramp_file.
+
+    Parameters
+    ----------
+
+    file_list:
+        List. File paths to monthly RAMP data in zipped format.
+
+    cache_dir:
+        String. The directory where cached Parquet files and their keys are saved.
+
+    Returns
+    -------
+
+    None
+
+    """
+    for mo_data in file_list:
+        print(mo_data)
+        cache_ramp_file(mo_data, cache_dir)
+    return
+
+
+def prefilter_ramp_lines(rampfile, ir_repo_id, buffer_size=1048576):
+    """Copies the header and the lines of a RAMP CSV that contain a repository
+    identifier to an in-memory file, without parsing them. Lines that merely
+    contain the identifier elsewhere, e.g. in a URL, are also copied, so the
+    repository_id column must still be checked once the result is parsed.
+
+    :param rampfile:
+        A binary file-like object, e.g. an open zip file member.
+
+    :param ir_repo_id:
+        A locally unique repository identifier.
+
+    :param buffer_size:
+        The read buffer size in bytes.
+
+    :return ir_lines:
+        A BytesIO object containing the header and the candidate lines.
+    """
+    needle = ir_repo_id.encode("utf-8")
+    reader = io.BufferedReader(rampfile, buffer_size)
+    ir_lines = io.BytesIO()
+    ir_lines.write(reader.readline())
+    for line in reader:
+        if needle in line:
+            ir_lines.write(line)
+    ir_lines.seek(0)
+    return ir_lines
+
+
+def extract_subset_ramp_data(zip_file, ir_repo_id, chunksize=None, columns=None, cache_dir=None,
+                             engine=None, prefilter=False, rampfile=None):
     """This function tries to conserve memory by opening zipped RAMP monthly data
        files one at a time and subsetting the data to a single repository's data
        for that month, prior to further processing or aggregation.
@@ -60,6 +826,33 @@ def extract_subset_ramp_data(zip_file, ir_repo_id):
         String. A locally unique repository identifier which will be used to
         subset the unzipped data.
 
+    chunksize:
+        Integer. Optional. If provided, the monthly file is streamed from the zip
+        file and filtered this many rows at a time, so that memory use is bounded
+        by the chunk size instead of by the size of the month.
+
+    columns:
+        List. Optional. The columns to be parsed, using the types declared in
+        RAMP_SCHEMAS. All columns are parsed if not provided.
+
+    cache_dir:
+        String. Optional. If provided, the data are read from a Parquet cache of the
+        zip file (see cache_ramp_file), reading only the row groups that may contain
+        the specified repository. The cache is built first if needed.
+
+    engine:
+        String. Optional. The CSV parser to be used, e.g. "pyarrow" for the
+        multithreaded pyarrow parser. See read_ramp_csv.
+
+    prefilter:
+        Boolean. If True, only the lines of the monthly file that contain the
+        repository identifier are parsed (see prefilter_ramp_lines), and chunksize
+        is ignored. This assumes that no field of the CSV spans several lines.
+
+    rampfile:
+        File object. Optional. The unzipped contents of zip_file, e.g. from
+        prefetch_ramp_files. The zip file is opened if not provided.
+
     Returns
     -------
 
@@ -67,17 +860,79 @@ def extract_subset_ramp_data(zip_file, ir_repo_id):
         A Pandas dataframe. The subset of RAMP data for the specified repository and month.
 
     """
-    with ZipFile(zip_file) as rampzip:
-        with rampzip.open(rampzip.namelist()[0]) as rampfile:
-            ramp_df = pd.read_csv(rampfile)
-    ir_data = ramp_df[ramp_df["repository_id"] == ir_repo_id].copy()
+    if columns is not None and "repository_id" not in columns:
+        columns = columns + ["repository_id"]
+    if cache_dir is not None:
+        cache_file = cache_ramp_file(zip_file, cache_dir)
+        ir_data = pd.read_parquet(cache_file, columns=columns,
+                                  filters=[("repository_id", "==", ir_repo_id)])
+        return ir_data
+    family = get_ramp_family(zip_file)
+    with open_ramp_file(zip_file, rampfile) as rampfile:
+        if prefilter:
+            ir_lines = prefilter_ramp_lines(rampfile, ir_repo_id)
+            ramp_df = read_ramp_csv(ir_lines, family, columns, engine=engine)
+            # Drop lines that matched the identifier outside of repository_id
+            ir_data = ramp_df[ramp_df["repository_id"] == ir_repo_id].copy()
+        elif chunksize is None:
+            ramp_df = read_ramp_csv(rampfile, family, columns, engine=engine)
+            ir_data = ramp_df[ramp_df["repository_id"] == ir_repo_id].copy()
+        else:
+            # Only the matching rows of each chunk are kept
+            ir_chunks = [chunk[chunk["repository_id"] == ir_repo_id]
+                         for chunk in read_ramp_csv(rampfile, family, columns, chunksize, engine)]
+            ir_data = concat_frames(ir_chunks, columns or list(RAMP_SCHEMAS[family]))
+            # Each chunk has its own categories, which pd.concat turns into object
+            # columns, so the categories of all chunks are combined
+            for col in ir_data.columns:
+                if ir_chunks and RAMP_SCHEMAS[family].get(col) == "category":
+                    ir_data[col] = union_categoricals([chunk[col] for chunk in ir_chunks], sort_categories=True)
     return ir_data
 
 
-def get_ir_data(ir_repo_id, cols, file_list):
+def map_ramp_files(func, file_list, workers=None, prefetch=None):
+    """Applies a function to each file in a list of RAMP data files and yields the
+    results in the order of the list. If more than one worker is requested, the
+    files are processed in parallel on a pool of worker processes, so the results
+    are the same as when processing serially. On Windows, scripts that use workers
+    must make their calls under 'if __name__ == "__main__":'.
+
+    :param func:
+        A picklable function taking a single file path, e.g. a module level
+        function or a functools.partial of one.
+
+    :param file_list:
+        A list of file paths.
+
+    :param workers:
+        The number of worker processes. Files are processed serially if None or 1.
+
+    :param prefetch:
+        Optional. When processing serially, read and inflate up to this many files
+        ahead on a background thread (see prefetch_ramp_files), and pass each one
+        to the function as its rampfile keyword argument. Ignored with workers.
+
+    :return results:
+        A generator of the function's results, in file_list order.
+    """
+    if (workers is None or workers < 2) and prefetch:
+        for f, rampfile in prefetch_ramp_files(file_list, prefetch):
+            yield func(f, rampfile=rampfile)
+        return
+    if workers is None or workers < 2:
+        for f in file_list:
+            yield func(f)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(func, file_list):
+            yield result
+
+
+def get_ir_data(ir_repo_id, cols, file_list, chunksize=None, cache_dir=None, workers=None,
+                engine=None, prefilter=False, prefetch=None):
     """This function iterates through a list of zipped RAMP data files to
-       aggregate a subset of complete RAMP data for a single IR. Creates
-       an empty Pandas dataframe and then appends monthly data to it.
+       aggregate a subset of complete RAMP data for a single IR. Monthly
+       data are collected in a list and concatenated once.
 
     Parameters
     ----------
@@ -87,12 +942,36 @@ def get_ir_data(ir_repo_id, cols, file_list):
         whose data will be aggregated.
 
     cols:
-        List. Column names to be used in the empty dataframe. Appended data will
-        have the same columns by default.
+        List. Column names to be parsed from each monthly file, which are also used
+        in the empty dataframe.
 
     file_list:
         List. File paths to monthly RAMP data in zipped format.
 
+    chunksize:
+        Integer. Optional. Stream each monthly file in chunks of this many rows.
+        See extract_subset_ramp_data.
+
+    cache_dir:
+        String. Optional. Read each monthly file from its Parquet cache in this
+        directory. See extract_subset_ramp_data.
+
+    workers:
+        Integer. Optional. The number of worker processes used to extract months in
+        parallel. Months are combined in file_list order, as in the serial case.
+
+    engine:
+        String. Optional. The CSV parser to be used. See read_ramp_csv.
+
+    prefilter:
+        Boolean. If True, only lines containing the repository identifier are
+        parsed. See extract_subset_ramp_data.
+
+    prefetch:
+        Integer. Optional. The number of months to read and inflate ahead on a
+        background thread while the current month is parsed. Not used with
+        cache_dir or workers. See prefetch_ramp_files.
+
     Returns
     -------
 
@@ -101,18 +980,326 @@ def get_ir_data(ir_repo_id, cols, file_list):
         months included in the file_list.
 
     """
-    ir_data = pd.DataFrame(columns=cols)
-    # append data from each month
-    for mo_data in file_list:
-        # print(mo_data)
-        ir_data = ir_data.append(extract_subset_ramp_data(mo_data, ir_repo_id))
+    extract = partial(extract_subset_ramp_data, ir_repo_id=ir_repo_id, chunksize=chunksize,
+                      columns=cols, cache_dir=cache_dir, engine=engine, prefilter=prefilter)
+    if cache_dir is not None:
+        prefetch = None
+    # combine data from each month
+    ir_data = concat_frames(map_ramp_files(extract, file_list, workers, prefetch), cols)
     return ir_data
 
 
-def get_v1_data(ir_repo_id):
+def remove_ramp_partitions(zip_file, store_dir):
+    """Deletes the partitions that were written from a zipped monthly file by
+    partition_ramp_file, e.g. before the file is partitioned again.
+
+    :param zip_file:
+        A path to a zipped monthly RAMP data file.
+
+    :param store_dir:
+        The root directory of the partitioned dataset.
+
+    :return:
+        None
+    """
+    part_file = os.path.splitext(os.path.basename(zip_file))[0] + ".csv"
+    family = get_ramp_family(zip_file)
+    for f in glob.glob(os.path.join(store_dir, family, "*", "*", "*", part_file)):
+        os.remove(f)
+    return
+
+
+def partition_ramp_file(zip_file, store_dir):
+    """This function reads a zipped RAMP monthly data file exactly once and
+       splits it into per-repository partitions of a partitioned dataset, so
+       that per-IR processing does not need to re-read the complete monthly file
+       for every IR. Rows are partitioned on their own dates, so the dataset is
+       laid out as store_dir/<family>/<YYYY>/<MM>/<repository_id>/<zip file name>.csv.
+
+    Parameters
+    ----------
+
+    zip_file:
+        String. A file path pointing to a zip file.
+
+    store_dir:
+        String. The root directory of the partitioned dataset.
+
+    Returns
+    -------
+
+    repo_ids:
+        List. The repository identifiers present in the monthly file.
+
+    """
+    family = get_ramp_family(zip_file)
+    if family is None:
+        raise ValueError("Not a recognized RAMP data file: " + zip_file)
+    with ZipFile(zip_file) as rampzip:
+        with rampzip.open(rampzip.namelist()[0]) as rampfile:
+            ramp_df = read_ramp_csv(rampfile, family)
+    # Partitions from an earlier version of the file must not be left behind
+    remove_ramp_partitions(zip_file, store_dir)
+    part_file = os.path.splitext(os.path.basename(zip_file))[0] + ".csv"
+    months = ramp_df["date"].dt.to_period("M")
+    repo_ids = []
+    for (ir_repo_id, month), ir_data in ramp_df.groupby(["repository_id", months], observed=True):
+        ir_dir = os.path.join(store_dir, family, "%04d" % month.year, "%02d" % month.month, ir_repo_id)
+        os.makedirs(ir_dir, exist_ok=True)
+        ir_data.to_csv(os.path.join(ir_dir, part_file), index=False)
+        if ir_repo_id not in repo_ids:
+            repo_ids.append(ir_repo_id)
+    return repo_ids
+
+
+def partition_ramp_data(file_list, store_dir):
+    """This function iterates through a list of zipped RAMP data files and
+       partitions each of them by month and repository. Every monthly file is
+       read once, regardless of how many IR are included in it.
+
+    Parameters
+    ----------
+
+    file_list:
+        List. File paths to monthly RAMP data in zipped format.
+
+    store_dir:
+        String. The root directory of the partitioned dataset.
+
+    Returns
+    -------
+
+    None
+
+    """
+    for mo_data in file_list:
+        print(mo_data)
+        partition_ramp_file(mo_data, store_dir)
+    return
+
+
+def get_ramp_rollups(family):
+    """Lists the rollups that can be built from a RAMP file family, i.e. those
+    whose key columns are all in the family's schema.
+
+    :param family:
+        The RAMP file family, a key of RAMP_SCHEMAS.
+
+    :return rollups:
+        A dictionary of rollup names and key columns, see RAMP_ROLLUPS.
+    """
+    schema = RAMP_SCHEMAS[family]
+    return {rollup: keys for rollup, keys in RAMP_ROLLUPS.items()
+            if all(key in schema for key in keys if key != "month")}
+
+
+def get_rollup_file(zip_file, rollup, rollup_dir):
+    """Returns the path of the Parquet file holding a rollup of a monthly file.
+
+    :param zip_file:
+        A path to a zipped monthly RAMP data file.
+
+    :param rollup:
+        The name of the rollup, a key of RAMP_ROLLUPS.
+
+    :param rollup_dir:
+        The root directory of the rollups.
+
+    :return rollup_file:
+        The path <rollup_dir>/<rollup>/<zip file stem>.parquet.
+    """
+    stem = os.path.splitext(os.path.basename(zip_file))[0]
+    return os.path.join(rollup_dir, rollup, stem + ".parquet")
+
+
+def rollup_ramp_file(zip_file, rollup_dir):
+    """This function reads a zipped RAMP monthly data file once and writes each of
+       the rollups in RAMP_ROLLUPS that its family supports, so that daily and
+       per URL aggregates can be computed without reading the raw rows again.
+       Requires the pyarrow package.
+
+    Parameters
+    ----------
+
+    zip_file:
+        String. A file path pointing to a zip file.
+
+    rollup_dir:
+        String. The root directory of the rollups. See get_rollup_file.
+
+    Returns
+    -------
+
+    rollups:
+        List. The names of the rollups written.
+
+    """
+    family = get_ramp_family(zip_file)
+    rollups = get_ramp_rollups(family)
+    key_columns = set(col for keys in rollups.values() for col in keys)
+    columns = [col for col in RAMP_SCHEMAS[family] if col in key_columns or col in RAMP_ROLLUP_MEASURES]
+    with open_ramp_file(zip_file) as rampfile:
+        ramp_df = read_ramp_csv(rampfile, family, columns)
+    ramp_df["month"] = ramp_df["date"].dt.strftime("%Y-%m")
+    # Positions are summed at full precision
+    ramp_df["position"] = ramp_df["position"].astype("float64")
+    measures = {measure: (measure, "sum") for measure in RAMP_ROLLUP_MEASURES}
+    measures["rows"] = ("clicks", "size")
+    for rollup, keys in rollups.items():
+        # Rows with missing keys are kept, so that the rollups add up to the file
+        rollup_df = ramp_df.groupby(keys, observed=True, dropna=False).agg(**measures).reset_index()
+        rollup_df["repository_id"] = rollup_df["repository_id"].astype(object)
+        rollup_file = get_rollup_file(zip_file, rollup, rollup_dir)
+        os.makedirs(os.path.dirname(rollup_file), exist_ok=True)
+        rollup_df.to_parquet(rollup_file + ".tmp", index=False)
+        os.replace(rollup_file + ".tmp", rollup_file)
+    return list(rollups)
+
+
+def rollup_ramp_data(file_list, rollup_dir):
+    """This function builds the rollups of a list of zipped RAMP data files. Files
+       whose rollups are newer than the file are skipped. See rollup_ramp_file.
+
+    Parameters
+    ----------
+
+    file_list:
+        List. File paths to monthly RAMP data in zipped format.
+
+    rollup_dir:
+        String. The root directory of the rollups.
+
+    Returns
+    -------
+
+    None
+
+    """
+    for mo_data in file_list:
+        rollup_files = [get_rollup_file(mo_data, rollup, rollup_dir)
+                        for rollup in get_ramp_rollups(get_ramp_family(mo_data))]
+        if all(os.path.exists(f) and os.path.getmtime(f) >= os.path.getmtime(mo_data) for f in rollup_files):
+            continue
+        print(mo_data)
+        rollup_ramp_file(mo_data, rollup_dir)
+    return
+
+
+def read_ramp_rollup(zip_file, rollup, rollup_dir, repos=None):
+    """Reads a rollup of a monthly file written by rollup_ramp_file.
+
+    :param zip_file:
+        A path to a zipped monthly RAMP data file.
+
+    :param rollup:
+        The name of the rollup, a key of RAMP_ROLLUPS.
+
+    :param rollup_dir:
+        The root directory of the rollups.
+
+    :param repos:
+        Optional. A list of repository_id values to be read. All repositories are
+        read if None.
+
+    :return rollup_df:
+        A pandas dataframe with the rollup's key columns, the summed measures and
+        a count of rows.
+    """
+    filters = None if repos is None else [("repository_id", "in", list(repos))]
+    return pd.read_parquet(get_rollup_file(zip_file, rollup, rollup_dir), filters=filters)
+
+
+def sum_ramp_rollup(zip_file, rollup, keys, rollup_dir, repos=None):
+    """Sums the clicks of a rollup of a monthly file over fewer keys, e.g. the
+    daily clicksums of all repositories from the "daily" rollup.
+
+    :param zip_file:
+        A path to a zipped monthly RAMP data file.
+
+    :param rollup:
+        The name of the rollup, a key of RAMP_ROLLUPS.
+
+    :param keys:
+        A list of the rollup's key columns to group by.
+
+    :param rollup_dir:
+        The root directory of the rollups.
+
+    :param repos:
+        Optional. A list of repository_id values to be included.
+
+    :return clicks:
+        A pandas dataframe with the key columns and clicks, sorted by the keys.
+    """
+    rollup_df = read_ramp_rollup(zip_file, rollup, rollup_dir, repos)
+    return sum_clicks_by(rollup_df, keys)
+
+
+def scan_ramp_store(family, repos=None, start=None, end=None, columns=None,
+                    store_dir="./ramp_partitioned"):
+    """This function queries the partitioned dataset written by partition_ramp_data.
+       Partitions are selected by family, month and repository from the directory
+       layout alone, so only the files that can contain matching rows are read.
+
+    Parameters
+    ----------
+
+    family:
+        String. A RAMP file family, i.e. a key of RAMP_SCHEMAS.
+
+    repos:
+        List. Optional. Repository identifiers to be read. All repositories are
+        read if not provided.
+
+    start:
+        Optional. The first date to be included, as a string or datetime.
+
+    end:
+        Optional. The last date to be included, as a string or datetime.
+
+    columns:
+        List. Optional. The columns to be returned. All columns declared for the
+        family in RAMP_SCHEMAS are returned if not provided.
+
+    store_dir:
+        String. The root directory of the partitioned dataset.
+
+    Returns
+    -------
+
+    ramp_data:
+        A Pandas dataframe. The matching RAMP data, in month order.
+
+    """
+    cols = columns if columns is not None else list(RAMP_SCHEMAS[family])
+    part_list = []
+    for month_dir in sorted(glob.glob(os.path.join(store_dir, family, "*", "*"))):
+        year_dir, mo = os.path.split(month_dir)
+        month = pd.Period(year=int(os.path.basename(year_dir)), month=int(mo), freq="M")
+        if not month_in_range(month, start, end):
+            continue
+        repo_dirs = repos if repos is not None else sorted(os.listdir(month_dir))
+        for ir_repo_id in repo_dirs:
+            part_list.extend(sorted(glob.glob(os.path.join(month_dir, ir_repo_id, "*.csv"))))
+    if not part_list:
+        return pd.DataFrame(columns=cols)
+    # Dates are needed to trim partial months at either end of the range
+    read_cols = cols if "date" in cols or (start is None and end is None) else cols + ["date"]
+    ramp_data = pd.concat([read_ramp_csv(f, family, read_cols) for f in part_list])
+    if start is not None:
+        ramp_data = ramp_data[ramp_data["date"] >= pd.Timestamp(start)]
+    if end is not None:
+        ramp_data = ramp_data[ramp_data["date"] <= pd.Timestamp(end)]
+    if "date" not in cols:
+        ramp_data = ramp_data.drop(columns="date")
+    return ramp_data
+
+
+def get_v1_data(ir_repo_id, partition_dir=None, columns=None, workers=None, prefilter=False):
     """This function aggregates all RAMP data that was harvested for a single IR
        between January 1, 2017 and August 18, 2018 ("v1" data). Column names
-       for those data are hard coded. A list of data files is also generated.
+       and types for those data are taken from RAMP_SCHEMAS. A list of data files
+       is also generated.
 
        TODO: It may be useful to remove this function and subset the v1
        data for each month as part of the v2 aggregations. Leaving it for
@@ -125,6 +1312,23 @@ def get_v1_data(ir_repo_id):
         String. A locally unique repository identifier, designating the repository
         whose data will be aggregated.
 
+    partition_dir:
+        String. Optional. The root directory of a partitioned dataset written by
+        partition_ramp_data. If provided, the IR data are read from the "all"
+        partitions instead of from the zipped monthly files.
+
+    columns:
+        List. Optional. The columns to be parsed. All columns declared for the
+        "all" file family in RAMP_SCHEMAS are parsed if not provided.
+
+    workers:
+        Integer. Optional. The number of worker processes used to extract months
+        in parallel. See get_ir_data.
+
+    prefilter:
+        Boolean. If True, only lines containing the repository identifier are
+        parsed. See extract_subset_ramp_data.
+
     Returns
     -------
 
@@ -132,17 +1336,20 @@ def get_v1_data(ir_repo_id):
         A Pandas dataframe. The aggregated RAMP "v1" data for the specified IR across all
         months included in the all_data_file_list.
     """
-    all_cols = ['citableContent', 'clickThrough', 'clicks', 'country', 'date', 'device',
-                'impressions', 'index', 'position', 'url', 'repository_id']
-    all_data_file_list = glob.glob("./ramp_zipped/*/*all.zip")
-    ir_v1_data = get_ir_data(ir_repo_id, all_cols, all_data_file_list)
+    all_cols = columns if columns is not None else list(RAMP_SCHEMAS["all"])
+    if partition_dir is not None:
+        return scan_ramp_store("all", [ir_repo_id], columns=all_cols,
+                               store_dir=partition_dir)
+    all_data_file_list = list_ramp_files("all")
+    ir_v1_data = get_ir_data(ir_repo_id, all_cols, all_data_file_list, workers=workers,
+                             prefilter=prefilter)
     return ir_v1_data
 
 
-def get_v2_pc_data(ir_repo_id):
+def get_v2_pc_data(ir_repo_id, partition_dir=None, columns=None, workers=None, prefilter=False):
     """This function aggregates all RAMP page click data harvested for a single
-       IR since August 19, 2018 ("v2" data). Column names for those data are hard
-       coded. A list of data files is also generated.
+       IR since August 19, 2018 ("v2" data). Column names and types for those
+       data are taken from RAMP_SCHEMAS. A list of data files is also generated.
 
     Parameters
     ----------
@@ -151,6 +1358,23 @@ def get_v2_pc_data(ir_repo_id):
         String. A locally unique repository identifier, designating the repository
         whose data will be aggregated.
 
+    partition_dir:
+        String. Optional. The root directory of a partitioned dataset written by
+        partition_ramp_data. If provided, the IR data are read from the
+        "page-clicks" partitions instead of from the zipped monthly files.
+
+    columns:
+        List. Optional. The columns to be parsed. All columns declared for the
+        "page-clicks" file family in RAMP_SCHEMAS are parsed if not provided.
+
+    workers:
+        Integer. Optional. The number of worker processes used to extract months
+        in parallel. See get_ir_data.
+
+    prefilter:
+        Boolean. If True, only lines containing the repository identifier are
+        parsed. See extract_subset_ramp_data.
+
     Returns
     -------
 
@@ -158,17 +1382,20 @@ def get_v2_pc_data(ir_repo_id):
         A Pandas dataframe. The aggregated RAMP page clicks data for the specified
         IR across all months included in the pageclick_data_file_list.
     """
-    pageclick_cols = ['citableContent', 'clickThrough', 'clicks', 'date', 'impressions',
-                      'index', 'position', 'url', 'repository_id']
-    pageclick_data_file_list = glob.glob("./ramp_zipped/*/*all_page-clicks.zip")
-    ir_v2_pc_data = get_ir_data(ir_repo_id, pageclick_cols, pageclick_data_file_list)
+    pageclick_cols = columns if columns is not None else list(RAMP_SCHEMAS["page-clicks"])
+    if partition_dir is not None:
+        return scan_ramp_store("page-clicks", [ir_repo_id], columns=pageclick_cols,
+                               store_dir=partition_dir)
+    pageclick_data_file_list = list_ramp_files("page-clicks")
+    ir_v2_pc_data = get_ir_data(ir_repo_id, pageclick_cols, pageclick_data_file_list, workers=workers,
+                                prefilter=prefilter)
     return ir_v2_pc_data
 
 
-def get_v2_ai_data(ir_repo_id):
+def get_v2_ai_data(ir_repo_id, partition_dir=None, columns=None, workers=None, prefilter=False):
     """This function aggregates all RAMP country/device access data harvested for
-       a single  IR since August 19, 2018 ("v2" data). Column names for those data
-       are hard coded. A list of data files is also generated.
+       a single  IR since August 19, 2018 ("v2" data). Column names and types for
+       those data are taken from RAMP_SCHEMAS. A list of data files is also generated.
 
     Parameters
     ----------
@@ -177,6 +1404,24 @@ def get_v2_ai_data(ir_repo_id):
         String. A locally unique repository identifier, designating the repository
         whose data will be aggregated.
 
+    partition_dir:
+        String. Optional. The root directory of a partitioned dataset written by
+        partition_ramp_data. If provided, the IR data are read from the
+        "country-device-info" partitions instead of from the zipped monthly files.
+
+    columns:
+        List. Optional. The columns to be parsed. All columns declared for the
+        "country-device-info" file family in RAMP_SCHEMAS are parsed if not
+        provided.
+
+    workers:
+        Integer. Optional. The number of worker processes used to extract months
+        in parallel. See get_ir_data.
+
+    prefilter:
+        Boolean. If True, only lines containing the repository identifier are
+        parsed. See extract_subset_ramp_data.
+
     Returns
     -------
 
@@ -184,21 +1429,53 @@ def get_v2_ai_data(ir_repo_id):
         A Pandas dataframe. The aggregated RAMP country/device data for the specified
         IR across all months included in the demographic_data_file_list.
     """
-    demographic_cols = ['clickThrough', 'clicks', 'country', 'date', 'device', 'impressions',
-                        'index', 'position', 'repository_id']
-    demographic_data_file_list = glob.glob("./ramp_zipped/*/*all_country-device-info.zip")
-    ir_v2_ai_data = get_ir_data(ir_repo_id, demographic_cols, demographic_data_file_list)
+    demographic_cols = columns if columns is not None else list(RAMP_SCHEMAS["country-device-info"])
+    if partition_dir is not None:
+        return scan_ramp_store("country-device-info", [ir_repo_id], columns=demographic_cols,
+                               store_dir=partition_dir)
+    demographic_data_file_list = list_ramp_files("country-device-info")
+    ir_v2_ai_data = get_ir_data(ir_repo_id, demographic_cols, demographic_data_file_list, workers=workers,
+                                prefilter=prefilter)
     return ir_v2_ai_data
 
 
-def concat_ramp_versions(v1_data, v2_data):
+def project_ramp_versions(v1_data, v2_data):
+    """This function presents v1 and v2 data as two parts with the v2 columns,
+       without concatenating them. The v1 data are projected onto the v2 columns
+       by column selection. With copy-on-write, the default from pandas 3.0 and
+       an option (pd.options.mode.copy_on_write = True) in pandas 2.x, the
+       selection does not copy the data until it is modified; otherwise pandas
+       copies the selected v1 columns. The same v1 data can be projected onto both
+       the page click and the access info columns. Aggregations can process the
+       parts in turn, so that with copy-on-write the v1 history is never
+       duplicated in memory.
+
+    Parameters
+    ----------
+
+    v1_data:
+        A Pandas dataframe. RAMP "v1" data, e.g. from get_v1_data.
+
+    v2_data:
+        A Pandas dataframe. RAMP "v2" page click or access info data.
+
+    Returns
+    -------
+
+    ramp_parts:
+        List. The projected v1 data and the v2 data, in that order.
+
+    """
     subset_cols = list(v2_data.columns.values)
-    v1_subset = v1_data[subset_cols].copy()
-    v1_v2_concatenated = pd.concat([v1_subset, v2_data], ignore_index=True)
+    return [v1_data[subset_cols], v2_data]
+
+
+def concat_ramp_versions(v1_data, v2_data):
+    v1_v2_concatenated = pd.concat(project_ramp_versions(v1_data, v2_data), ignore_index=True)
     return v1_v2_concatenated
 
 
-def process_repo(ir_repo_id):
+def process_repo(ir_repo_id, partition_dir=None, workers=None, prefilter=False, as_parts=False):
     """This is basically a workflow function that calls all the other functions.
 
     Parameters
@@ -207,27 +1484,49 @@ def process_repo(ir_repo_id):
     ir_repo_id:
        String. A locally unique identifier for the repository whose data will be aggregated.
 
+    partition_dir:
+       String. Optional. The root directory of a partitioned dataset written by
+       partition_ramp_data, to be read instead of the zipped monthly files.
+
+    workers:
+       Integer. Optional. The number of worker processes used to extract months in
+       parallel from the zipped monthly files. See get_ir_data.
+
+    prefilter:
+       Boolean. If True, only lines of the zipped monthly files that contain the
+       repository identifier are parsed. See extract_subset_ramp_data.
+
+    as_parts:
+       Boolean. If True, the page click and the access info data are each returned
+       as a list of the v1 data projected onto the v2 columns and the v2 data (see
+       project_ramp_versions) instead of one concatenated dataframe. Both lists
+       share the single v1 load, so with copy-on-write (pandas 3.0 and later) the
+       v1 history is held in memory once. Concatenating copies it into each of
+       the two outputs.
+
     Returns
     -------
 
     ir_complete_pc_data:
        A Pandas dataframe. The aggregated page click data across all the years/months
-       specified for the specified repository.
+       specified for the specified repository. A list of two dataframes if as_parts.
 
     ir_complete_ai_data:
        A Pandas dataframe. The aggreated country/device data across all the years/months
-       specified for the specified repository.
+       specified for the specified repository. A list of two dataframes if as_parts.
 
     """
-    ir_v1_data = get_v1_data(ir_repo_id)
-    ir_v2_pc_data = get_v2_pc_data(ir_repo_id)
-    ir_v2_ai_data = get_v2_ai_data(ir_repo_id)
+    ir_v1_data = get_v1_data(ir_repo_id, partition_dir, workers=workers, prefilter=prefilter)
+    ir_v2_pc_data = get_v2_pc_data(ir_repo_id, partition_dir, workers=workers, prefilter=prefilter)
+    ir_v2_ai_data = get_v2_ai_data(ir_repo_id, partition_dir, workers=workers, prefilter=prefilter)
+    if as_parts:
+        return project_ramp_versions(ir_v1_data, ir_v2_pc_data), project_ramp_versions(ir_v1_data, ir_v2_ai_data)
     ir_complete_pc_data = concat_ramp_versions(ir_v1_data, ir_v2_pc_data)
     ir_complete_ai_data = concat_ramp_versions(ir_v1_data, ir_v2_ai_data)
     return ir_complete_pc_data, ir_complete_ai_data
 
 
-def process_repo_day_clicks(ir_repo_id):
+def process_repo_day_clicks(ir_repo_id, partition_dir=None, workers=None, rollup_dir=None):
     """This is basically a workflow function that calls all the other functions.
        Similar to the above function, but aggregates daily click data. For page click
        data the aggregation is per IR per day. For access info date the aggregation
@@ -239,6 +1538,18 @@ def process_repo_day_clicks(ir_repo_id):
     ir_repo_id:
        String. A locally unique identifier for the repository whose data will be aggregated.
 
+    partition_dir:
+       String. Optional. The root directory of a partitioned dataset written by
+       partition_ramp_data, to be read instead of the zipped monthly files.
+
+    workers:
+       Integer. Optional. The number of worker processes used to extract months in
+       parallel from the zipped monthly files. See get_ir_data.
+
+    rollup_dir:
+       String. Optional. The root directory of the rollups written by rollup_ramp_data,
+       to be summed instead of reading any raw data.
+
     Returns
     -------
 
@@ -250,28 +1561,52 @@ def process_repo_day_clicks(ir_repo_id):
        A Pandas dataframe. The aggregated daily country/device clicksums across all the years/months
        specified for the specified repository.
     """
-    ir_v1_data = get_v1_data(ir_repo_id)
-    ir_v2_pc_data = get_v2_pc_data(ir_repo_id)
-    ir_v2_ai_data = get_v2_ai_data(ir_repo_id)
-    ir_complete_pc_data = concat_ramp_versions(ir_v1_data, ir_v2_pc_data)
-    ir_complete_ai_data = concat_ramp_versions(ir_v1_data, ir_v2_ai_data)
-    ir_complete_pc_data_day_clicks = ir_complete_pc_data.groupby("date")
-    daily_pc_clicks = pd.DataFrame(columns=["date", "clicks", "repository_id"])
-    for name, group in ir_complete_pc_data_day_clicks:
-        daily_pc_clicks = daily_pc_clicks.append(pd.DataFrame([[name, group["clicks"].sum(), ir_repo_id]],
-                                                              columns=["date", "clicks", "repository_id"]))
-    ai_cols = ["date", "country", "device", "clicks", "repository_id"]
-    daily_ai_clicks = pd.DataFrame(columns=ai_cols)
-    for name, group in ir_complete_ai_data.groupby(["date", "country", "device"]):
-        daily_ai_clicks = daily_ai_clicks.append(pd.DataFrame([[name[0], name[1], name[2],
-                                                                group["clicks"].sum(), ir_repo_id]],
-                                                              columns=ai_cols))
+    if rollup_dir is not None:
+        pc_file_list = list_ramp_files("all") + list_ramp_files("page-clicks")
+        ai_file_list = list_ramp_files("all") + list_ramp_files("country-device-info")
+        daily_pc_parts = [sum_ramp_rollup(f, "daily", ["date"], rollup_dir, [ir_repo_id])
+                          for f in pc_file_list]
+        daily_pc_clicks = sum_clicks_by(concat_frames(daily_pc_parts, ["date", "clicks"]), ["date"])
+        daily_pc_clicks["repository_id"] = ir_repo_id
+        ai_keys = ["date", "country", "device"]
+        daily_ai_parts = [sum_ramp_rollup(f, "daily_country_device", ai_keys, rollup_dir, [ir_repo_id])
+                          for f in ai_file_list]
+        daily_ai_clicks = sum_clicks_by(concat_frames(daily_ai_parts, ai_keys + ["clicks"]), ai_keys)
+        daily_ai_clicks["repository_id"] = ir_repo_id
+        daily_pc_clicks["date"] = pd.to_datetime(daily_pc_clicks["date"])
+        daily_ai_clicks["date"] = pd.to_datetime(daily_ai_clicks["date"])
+        return daily_pc_clicks, daily_ai_clicks
+    # Only the columns used in the daily aggregations are parsed
+    ir_v1_data = get_v1_data(ir_repo_id, partition_dir,
+                             ["clicks", "country", "date", "device", "repository_id"], workers)
+    ir_v2_pc_data = get_v2_pc_data(ir_repo_id, partition_dir, ["clicks", "date", "repository_id"],
+                                   workers)
+    ir_v2_ai_data = get_v2_ai_data(ir_repo_id, partition_dir,
+                                   ["clicks", "country", "date", "device", "repository_id"], workers)
+    # The v1 and v2 parts are summed separately rather than concatenated, so the
+    # same v1 data serve both aggregations without being copied. Only the small
+    # per part sums are combined.
+    daily_pc_parts = [sum_clicks_by(ir_data, ["date"])
+                      for ir_data in project_ramp_versions(ir_v1_data, ir_v2_pc_data)]
+    daily_pc_clicks = sum_clicks_by(concat_frames(daily_pc_parts), ["date"])
+    daily_pc_clicks["repository_id"] = ir_repo_id
+    ai_keys = ["date", "country", "device"]
+    daily_ai_parts = [sum_clicks_by(ir_data, ai_keys)
+                      for ir_data in project_ramp_versions(ir_v1_data, ir_v2_ai_data)]
+    daily_ai_clicks = sum_clicks_by(concat_frames(daily_ai_parts), ai_keys)
+    daily_ai_clicks["repository_id"] = ir_repo_id
+    daily_pc_clicks["date"] = pd.to_datetime(daily_pc_clicks["date"])
+    daily_ai_clicks["date"] = pd.to_datetime(daily_ai_clicks["date"])
     return daily_pc_clicks, daily_ai_clicks
 
 
-def process_global_daily_clicks(alL_flist, pc_flist, ai_flist):
+def process_global_daily_clicks(alL_flist, pc_flist, ai_flist, workers=None, engine=None,
+                                prefetch=None, rollup_dir=None):
     """This function reads file names from a list and aggregates
-       global RAMP data per day.
+       global RAMP data per day. Each file is reduced to partial clicksums,
+       which are then merged with combine_click_sums, so the result is the
+       same for any file order or number of workers, and dates that occur in
+       more than one file are summed rather than repeated.
 
     Parameters
     ----------
@@ -285,6 +1620,22 @@ def process_global_daily_clicks(alL_flist, pc_flist, ai_flist):
     ai_flist:
         String. A list of RAMP access-info (country-device) data from Aug 19, 2018, onward.
 
+    workers:
+        Integer. Optional. The number of worker processes used to aggregate files in
+        parallel. Results are combined in file list order, as in the serial case.
+
+    engine:
+        String. Optional. The CSV parser to be used. See read_ramp_csv.
+
+    prefetch:
+        Integer. Optional. The number of files to read and inflate ahead on a
+        background thread while the current file is aggregated. Not used with
+        workers. See prefetch_ramp_files.
+
+    rollup_dir:
+        String. Optional. The root directory of the rollups written by
+        rollup_ramp_data, to be summed instead of reading any raw data.
+
     Returns
     -------
 
@@ -298,18 +1649,106 @@ def process_global_daily_clicks(alL_flist, pc_flist, ai_flist):
     """
     all_pc_file_list = alL_flist + pc_flist
     all_ai_file_list = alL_flist + ai_flist
+    extract_pc_clicks = partial(extract_daily_pc_clicks, engine=engine)
+    extract_ai_clicks = partial(extract_daily_ai_clicks, engine=engine)
+    if rollup_dir is not None:
+        extract_pc_clicks = partial(sum_ramp_rollup, rollup="daily", keys=["date"], rollup_dir=rollup_dir)
+        extract_ai_clicks = partial(sum_ramp_rollup, rollup="daily_country_device",
+                                    keys=["date", "country", "device"], rollup_dir=rollup_dir)
+        prefetch = None
 
     # Aggregate per day clicksums
-    day_pc_clicks_df = pd.DataFrame(columns=["date", "clicks"])
-    for f in all_pc_file_list:
+    day_pc_clicks_parts = []
+    daily_pc_clicks = map_ramp_files(extract_pc_clicks, all_pc_file_list, workers, prefetch)
+    for f, daily_clicks in zip(all_pc_file_list, daily_pc_clicks):
         print(f)
-        day_pc_clicks_df = day_pc_clicks_df.append(extract_daily_pc_clicks(f))
+        day_pc_clicks_parts.append(daily_clicks)
+    day_pc_clicks_df = combine_click_sums(day_pc_clicks_parts, ["date"])
 
     # Aggregate per day, country, device combo clicksums
-    day_ai_clicks_df = pd.DataFrame(columns=["date", "country", "device", "clicks"])
-    for f in all_ai_file_list:
+    day_ai_clicks_parts = []
+    daily_ai_clicks = map_ramp_files(extract_ai_clicks, all_ai_file_list, workers, prefetch)
+    for f, daily_clicks in zip(all_ai_file_list, daily_ai_clicks):
         print(f)
-        day_ai_clicks_df = day_ai_clicks_df.append(extract_daily_ai_clicks(f))
+        day_ai_clicks_parts.append(daily_clicks)
+    day_ai_clicks_df = combine_click_sums(day_ai_clicks_parts, ["date", "country", "device"])
 
+    day_pc_clicks_df["date"] = pd.to_datetime(day_pc_clicks_df["date"])
+    day_ai_clicks_df["date"] = pd.to_datetime(day_ai_clicks_df["date"])
     return day_pc_clicks_df, day_ai_clicks_df
 
+
+def write_daily_clicks_store(ir_daily_clicks, store_dir):
+    """Writes the daily clicksums of many IR to a consolidated store, so that they
+    can be loaded in one read instead of from two CSV files per IR. The pc and ai
+    series are written to the Arrow IPC files pc.arrow and ai.arrow, with one
+    record batch per IR, and index.json maps each repository_id to the position
+    of its batch, which the IPC file footer resolves to a file offset. Requires
+    the pyarrow package.
+
+    :param ir_daily_clicks:
+        An iterable of (ir_repo_id, daily_pc_clicks, daily_ai_clicks) tuples, e.g.
+        from process_repo_day_clicks, with the columns in DAILY_CLICKS_SCHEMAS.
+
+    :param store_dir:
+        The directory of the store. Existing store files are replaced once all
+        IR have been written.
+
+    :return:
+        None
+    """
+    import pyarrow as pa
+
+    arrow_types = {"date": pa.timestamp("ns"), "int64": pa.int64(), "object": pa.string()}
+    schemas = {family: pa.schema([(col, arrow_types[dtype]) for col, dtype in schema.items()])
+               for family, schema in DAILY_CLICKS_SCHEMAS.items()}
+    os.makedirs(store_dir, exist_ok=True)
+    index = {family: {} for family in DAILY_CLICKS_SCHEMAS}
+    tmp_files = {family: os.path.join(store_dir, family + ".arrow.tmp") for family in DAILY_CLICKS_SCHEMAS}
+    writers = {family: pa.ipc.new_file(tmp_files[family], schemas[family]) for family in DAILY_CLICKS_SCHEMAS}
+    try:
+        for ir_repo_id, daily_pc_clicks, daily_ai_clicks in ir_daily_clicks:
+            for family, daily_clicks in [("pc", daily_pc_clicks), ("ai", daily_ai_clicks)]:
+                batch = pa.RecordBatch.from_pandas(daily_clicks[list(schemas[family].names)],
+                                                   schema=schemas[family], preserve_index=False)
+                index[family][ir_repo_id] = len(index[family])
+                writers[family].write_batch(batch)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    for family, tmp_file in tmp_files.items():
+        os.replace(tmp_file, os.path.join(store_dir, family + ".arrow"))
+    with open(os.path.join(store_dir, "index.json.tmp"), "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(os.path.join(store_dir, "index.json.tmp"), os.path.join(store_dir, "index.json"))
+    return
+
+
+def read_daily_clicks_store(store_dir, family, ir_repo_id=None):
+    """Reads daily clicksums from a store written by write_daily_clicks_store. The
+    store is memory mapped, so reading a single IR only touches that IR's data.
+    Requires the pyarrow package.
+
+    :param store_dir:
+        The directory of the store.
+
+    :param family:
+        "pc" for the page click series, or "ai" for the access info series.
+
+    :param ir_repo_id:
+        Optional. The repository whose series is read. The series of all IR are
+        read in one pass and returned as a single dataframe if not provided.
+
+    :return daily_clicks:
+        A pandas dataframe with the columns in DAILY_CLICKS_SCHEMAS. Raises a
+        KeyError if ir_repo_id is not in the store.
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(os.path.join(store_dir, family + ".arrow")) as source:
+        reader = pa.ipc.open_file(source)
+        if ir_repo_id is None:
+            return reader.read_all().to_pandas()
+        with open(os.path.join(store_dir, "index.json")) as f:
+            position = json.load(f)[family][ir_repo_id]
+        return reader.get_batch(position).to_pandas()
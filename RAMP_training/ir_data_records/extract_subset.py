@@ -2,8 +2,9 @@
 import pandas as pd
 from zipfile import ZipFile
 import glob
+from aggregation_helpers import concat_frames
 
-def extract_subset_ramp_data(zip_file, ir_repo_id):
+def extract_subset_ramp_data(zip_file, ir_repo_id, chunksize=None):
     """This function tries to conserve memory by opening zipped RAMP monthly
        data files one at a time and subsetting the data to a single repository's
        data for that month, prior to further processing or aggregation.
@@ -18,6 +19,11 @@ def extract_subset_ramp_data(zip_file, ir_repo_id):
         String. A locally unique repository identifier which will be used to
         subset the unzipped data.
 
+    chunksize:
+        Integer. Optional. If provided, the monthly file is streamed from the
+        zip file and filtered this many rows at a time, so that memory use is
+        bounded by the chunk size instead of by the size of the month.
+
     Returns
     -------
 
@@ -28,16 +34,21 @@ def extract_subset_ramp_data(zip_file, ir_repo_id):
     """
     with ZipFile(zip_file) as rampzip:
         with rampzip.open(rampzip.namelist()[0]) as rampfile:
-            ramp_df = pd.read_csv(rampfile)
-    ir_data = ramp_df[ramp_df["repository_id"] == ir_repo_id].copy()
+            if chunksize is None:
+                ramp_df = pd.read_csv(rampfile)
+                ir_data = ramp_df[ramp_df["repository_id"] == ir_repo_id].copy()
+            else:
+                # Only the matching rows of each chunk are kept
+                ir_data = concat_frames(chunk[chunk["repository_id"] == ir_repo_id]
+                                        for chunk in pd.read_csv(rampfile, chunksize=chunksize))
     return ir_data
 
 #-------------------------------------------------------------------------------------
 
-def get_ir_data(ir_repo_id, cols, file_list):
+def get_ir_data(ir_repo_id, cols, file_list, chunksize=None):
     """This function iterates through a list of zipped RAMP data files to
-       aggregate a subset of complete RAMP data for a single IR. Creates
-       an empty Pandas dataframe and then appends monthly data to it.
+       aggregate a subset of complete RAMP data for a single IR. Monthly
+       data are collected in a list and concatenated once.
 
     Parameters
     ----------
@@ -53,6 +64,10 @@ def get_ir_data(ir_repo_id, cols, file_list):
     file_list:
         List. File paths to monthly RAMP data in zipped format.
 
+    chunksize:
+        Integer. Optional. Stream each monthly file in chunks of this many rows.
+        See extract_subset_ramp_data.
+
     Returns
     -------
 
@@ -61,11 +76,12 @@ def get_ir_data(ir_repo_id, cols, file_list):
         across all months included in the file_list.
 
     """
-    ir_data = pd.DataFrame(columns=cols)
-    # append data from each month
+    ir_data_parts = []
+    # collect data from each month
     for mo_data in file_list:
         print(mo_data)
-        ir_data = ir_data.append(extract_subset_ramp_data(mo_data, ir_repo_id))
+        ir_data_parts.append(extract_subset_ramp_data(mo_data, ir_repo_id, chunksize))
+    ir_data = concat_frames(ir_data_parts, cols)
     return ir_data
 
 #------------------------------------------------------------------------------------------------
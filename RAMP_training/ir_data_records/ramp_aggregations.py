@@ -1,25 +1,181 @@
 from aggregation_helpers import *
+from ramp_work_queue import submit_work, collect_work
 
 
-def get_global_daily_clicks():
-    all_data_file_list = glob.glob("./ramp_zipped/*/*all.zip")
-    pageclick_data_file_list = glob.glob("./ramp_zipped/*/*all_page-clicks.zip")
-    demographic_data_file_list = glob.glob("./ramp_zipped/*/*all_country-device-info.zip")
+def get_global_daily_clicks(workers=None, rollup_dir=None):
+    all_data_file_list = list_ramp_files("all")
+    pageclick_data_file_list = list_ramp_files("page-clicks")
+    demographic_data_file_list = list_ramp_files("country-device-info")
     day_pc_clicks_df, day_ai_clicks_df = process_global_daily_clicks(all_data_file_list,
                                                                      pageclick_data_file_list,
-                                                                     demographic_data_file_list)
+                                                                     demographic_data_file_list,
+                                                                     workers, rollup_dir=rollup_dir)
     day_pc_clicks_df.to_csv("RAMP_complete_daily_pc_clicks.csv", index=False)
     day_ai_clicks_df.to_csv("RAMP_complete_daily_ai_clicks.csv", index=False)
     return
 
 
-def get_per_ir_daily_clicks():
+def queue_global_daily_clicks(queue_dir="./ramp_queue", max_age=3600):
+    # Same outputs as get_global_daily_clicks, with the monthly files processed
+    # by workers on any host that shares queue_dir, each started with
+    # "python ramp_work_queue.py <queue_dir> <wait>". Claims that their worker
+    # has not touched for max_age seconds are handed out again, e.g. if a worker
+    # host goes down (running workers touch their claims every minute), so workers
+    # should wait longer than max_age for requeued units before exiting.
+    all_data_file_list = list_ramp_files("all")
+    pc_units = submit_work(queue_dir, "extract_daily_pc_clicks",
+                           all_data_file_list + list_ramp_files("page-clicks"))
+    ai_units = submit_work(queue_dir, "extract_daily_ai_clicks",
+                           all_data_file_list + list_ramp_files("country-device-info"))
+    day_pc_clicks_df = combine_click_sums(collect_work(queue_dir, pc_units, max_age=max_age), ["date"])
+    day_ai_clicks_df = combine_click_sums(collect_work(queue_dir, ai_units, max_age=max_age),
+                                          ["date", "country", "device"])
+    day_pc_clicks_df.to_csv("RAMP_complete_daily_pc_clicks.csv", index=False)
+    day_ai_clicks_df.to_csv("RAMP_complete_daily_ai_clicks.csv", index=False)
+    return
+
+
+def get_partial_file(partial_dir, zip_file, kind):
+    # Per-file daily clicksums, kind is "pc" or "ai"
+    stem = os.path.splitext(os.path.basename(zip_file))[0]
+    return os.path.join(partial_dir, stem + "_" + kind + "_daily_clicks.csv")
+
+
+def update_global_daily_clicks(workers=None, manifest_file="./ramp_manifest.json",
+                               partial_dir="./ramp_partials"):
+    # Same outputs as get_global_daily_clicks, but only new or changed monthly
+    # files are processed. The daily clicksums of each file are kept in
+    # partial_dir and the outputs are reassembled from them.
+    manifest = load_manifest(manifest_file)
+    file_lists = {family: list_ramp_files(family) for family in RAMP_FILE_PATTERNS}
+    file_list = file_lists["all"] + file_lists["page-clicks"] + file_lists["country-device-info"]
+    changed_files = get_changed_files(file_list, manifest, "global_daily_clicks")
+    os.makedirs(partial_dir, exist_ok=True)
+    pc_changed = [f for f in changed_files if get_ramp_family(f) != "country-device-info"]
+    for f, daily_clicks in zip(pc_changed, map_ramp_files(extract_daily_pc_clicks, pc_changed, workers)):
+        print(f)
+        daily_clicks.to_csv(get_partial_file(partial_dir, f, "pc"), index=False)
+    ai_changed = [f for f in changed_files if get_ramp_family(f) != "page-clicks"]
+    for f, daily_clicks in zip(ai_changed, map_ramp_files(extract_daily_ai_clicks, ai_changed, workers)):
+        print(f)
+        daily_clicks.to_csv(get_partial_file(partial_dir, f, "ai"), index=False)
+    all_pc_file_list = file_lists["all"] + file_lists["page-clicks"]
+    all_ai_file_list = file_lists["all"] + file_lists["country-device-info"]
+    day_pc_clicks_df = combine_click_sums([pd.read_csv(get_partial_file(partial_dir, f, "pc"))
+                                           for f in all_pc_file_list], ["date"])
+    day_ai_clicks_df = combine_click_sums([pd.read_csv(get_partial_file(partial_dir, f, "ai"),
+                                                       keep_default_na=False)
+                                           for f in all_ai_file_list], ["date", "country", "device"])
+    day_pc_clicks_df.to_csv("RAMP_complete_daily_pc_clicks.csv", index=False)
+    day_ai_clicks_df.to_csv("RAMP_complete_daily_ai_clicks.csv", index=False)
+    manifest["outputs"]["global_daily_clicks"] = {}
+    for f in file_list:
+        record_ingested_file(manifest, "global_daily_clicks", f)
+    save_manifest(manifest, manifest_file)
+    return
+
+
+def partition_global_data(partition_dir="./ramp_partitioned"):
+    # Each monthly file is read once and split into per-month, per-IR files
+    partition_ramp_data(list_ramp_files("all"), partition_dir)
+    partition_ramp_data(list_ramp_files("page-clicks"), partition_dir)
+    partition_ramp_data(list_ramp_files("country-device-info"), partition_dir)
+    return
+
+
+def cache_global_data(cache_dir="./ramp_cache"):
+    # One-time conversion of the monthly zip files to Parquet
+    cache_ramp_data(list_ramp_files("all"), cache_dir)
+    cache_ramp_data(list_ramp_files("page-clicks"), cache_dir)
+    cache_ramp_data(list_ramp_files("country-device-info"), cache_dir)
+    return
+
+
+def rollup_global_data(rollup_dir="./ramp_rollups"):
+    # Materializes the daily and per URL rollups of each new or changed monthly
+    # file, which get_global_daily_clicks(rollup_dir=...) then sums
+    rollup_ramp_data(list_ramp_files("all"), rollup_dir)
+    rollup_ramp_data(list_ramp_files("page-clicks"), rollup_dir)
+    rollup_ramp_data(list_ramp_files("country-device-info"), rollup_dir)
+    return
+
+
+def get_per_ir_daily_clicks(partition_dir="./ramp_partitioned",
+                            checkpoint_file="./per_ir_daily_clicks.checkpoint"):
+    # Partitioned monthly files and (IR, family) outputs are recorded in the
+    # checkpoint file as they finish, so a run that stops part way resumes from
+    # the first unfinished unit. The checkpoint is deleted once the run is done.
+    finished = load_checkpoint(checkpoint_file)
+    file_list = (list_ramp_files("all") + list_ramp_files("page-clicks") +
+                 list_ramp_files("country-device-info"))
+    for f in file_list:
+        if ("partition", f) in finished:
+            continue
+        print(f)
+        partition_ramp_file(f, partition_dir)
+        record_checkpoint(checkpoint_file, "partition", f)
     ir_info = pd.read_csv("RAMP_repository_info.csv")
     for ir in sorted(ir_info["repository_id"]):
+        if (ir, "pc") in finished and (ir, "ai") in finished:
+            continue
         print(ir)
-        ir_pc_data, ir_ai_data = process_repo_day_clicks(ir)
-        ir_pc_data.to_csv("daily_clicks/" + ir + "_RAMP_pc_daily_clicks.csv", index=False)
-        ir_ai_data.to_csv("daily_clicks/" + ir + "_RAMP_ai_daily_clicks.csv", index=False)
+        ir_pc_data, ir_ai_data = process_repo_day_clicks(ir, partition_dir)
+        for family, ir_data in [("pc", ir_pc_data), ("ai", ir_ai_data)]:
+            if (ir, family) not in finished:
+                write_csv_atomic(ir_data, "daily_clicks/" + ir + "_RAMP_" + family + "_daily_clicks.csv")
+                record_checkpoint(checkpoint_file, ir, family)
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    return
+
+
+def update_per_ir_daily_clicks(partition_dir="./ramp_partitioned", manifest_file="./ramp_manifest.json"):
+    # Same outputs as get_per_ir_daily_clicks, but only new or changed monthly
+    # files are partitioned, and only the IR found in them are re-aggregated.
+    manifest = load_manifest(manifest_file)
+    file_list = (list_ramp_files("all") + list_ramp_files("page-clicks") +
+                 list_ramp_files("country-device-info"))
+    changed_files = get_changed_files(file_list, manifest, "per_ir_daily_clicks")
+    removed_files = get_removed_files(file_list, manifest, "per_ir_daily_clicks")
+    ingested = manifest["outputs"].setdefault("per_ir_daily_clicks", {})
+    changed_irs = set()
+    for f in removed_files:
+        changed_irs.update(ingested.pop(f)["repos"])
+        remove_ramp_partitions(f, partition_dir)
+    for f in changed_files:
+        print(f)
+        if f in ingested:
+            changed_irs.update(ingested[f]["repos"])
+        repos = partition_ramp_file(f, partition_dir)
+        changed_irs.update(repos)
+        record_ingested_file(manifest, "per_ir_daily_clicks", f, repos=repos)
+    ir_info = pd.read_csv("RAMP_repository_info.csv")
+    for ir in sorted(ir_info["repository_id"]):
+        pc_file = "daily_clicks/" + ir + "_RAMP_pc_daily_clicks.csv"
+        ai_file = "daily_clicks/" + ir + "_RAMP_ai_daily_clicks.csv"
+        if ir not in changed_irs and os.path.exists(pc_file) and os.path.exists(ai_file):
+            continue
+        print(ir)
+        ir_pc_data, ir_ai_data = process_repo_day_clicks(ir, partition_dir)
+        write_csv_atomic(ir_pc_data, pc_file)
+        write_csv_atomic(ir_ai_data, ai_file)
+    save_manifest(manifest, manifest_file)
+    return
+
+
+def consolidate_daily_clicks(store_dir="./daily_clicks_store"):
+    # Collects the per-IR daily clicksums in daily_clicks/ into one store, which
+    # loads all IR in one read with read_daily_clicks_store(store_dir, "pc"),
+    # or a single IR with read_daily_clicks_store(store_dir, "pc", ir).
+    ir_info = pd.read_csv("RAMP_repository_info.csv")
+
+    def read_ir_daily_clicks(ir):
+        ir_pc_data = pd.read_csv("daily_clicks/" + ir + "_RAMP_pc_daily_clicks.csv", parse_dates=["date"])
+        ir_ai_data = pd.read_csv("daily_clicks/" + ir + "_RAMP_ai_daily_clicks.csv", parse_dates=["date"],
+                                 keep_default_na=False)
+        return ir, ir_pc_data, ir_ai_data
+
+    write_daily_clicks_store((read_ir_daily_clicks(ir) for ir in sorted(ir_info["repository_id"])), store_dir)
     return
 
 
@@ -27,5 +183,14 @@ def get_per_ir_daily_clicks():
 # get_global_daily_clicks()
 
 
+# Uncomment below to update the global RAMP daily clicksums after new monthly
+# files are added, processing only the new or changed files
+# update_global_daily_clicks()
+
+
 # Uncomment below to get per-IR daily clicksums and save to file
-# get_per_ir_daily_clicks()
\ No newline at end of file
+# get_per_ir_daily_clicks()
+
+
+# Uncomment below to collect the per-IR daily clicksums into one store
+# consolidate_daily_clicks()
\ No newline at end of file
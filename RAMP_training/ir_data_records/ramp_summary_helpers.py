@@ -0,0 +1,1175 @@
+"""Helpers for the RAMP summary statistics generated by RAMP-Summary.py: the
+platform specific functions that infer the HTML page and unique URI of the item
+containing a content file, the summary statistics engine, and the distinct
+count sketches kept per IR and month.
+"""
+
+import numpy as np
+import pandas as pd
+import os
+import re
+import hashlib
+import sqlite3
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from urllib.parse import urlparse, uses_params
+from aggregation_helpers import get_changed_files, record_ingested_file, get_ramp_month, month_in_range
+
+
+def make_dspace_html_url(bitstream_url):
+    """For DSpace IR, generate a URL for an HTML page that contains a bitstream
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the URL of a bitstream's parent HTML page
+       using the bitstream's URL. For DSpace IR this requires extracting the item's
+       Handle from the bitstream URL and inserting it into an item URL.
+
+    Parameters
+    ----------
+
+    bitstream_url:
+        The URL of a DSpace bitstream with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An HTML URL:
+        The URL of the HTML page ("item") that includes the bitstream.
+
+    """
+
+    p = urlparse(bitstream_url)
+
+    # Compile a regular expression to find the DSpace handle in the bitstream URL.
+    handle = re.compile("\/[0-9\?\.]+\/[0-9][0-9]+")
+
+    # Search the bitstream URL for the UI type.
+    xmlui = re.compile('xmlui')
+    jspui = re.compile('jspui')
+    dspace = re.compile('dspace')
+    h = handle.search(p.path)
+    x = xmlui.search(p.path)
+    j = jspui.search(p.path)
+    ds = dspace.search(p.path)
+
+    # Construct and return the item HTML page.
+    if h:
+        if j:
+            return p.scheme + '://' + p.netloc + '/' + 'jspui' + '/' + 'handle' + h.group()
+        elif x:
+            return p.scheme + '://' + p.netloc + '/' + 'xmlui' + '/' + 'handle' + h.group()
+        elif ds:
+            return p.scheme + '://' + p.netloc + '/' + 'dspace' + '/' + 'handle' + h.group()
+        else:
+            return p.scheme + '://' + p.netloc + '/' + 'handle' + h.group()
+
+
+def make_dspace_item_uri(bitstream_url):
+    """For DSpace IR, generate a URI for an HTML page that contains a bitstream
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the URL of a bitstream's parent HTML page
+       using the bitstream's URL. For DSpace IR this requires extracting the item's
+       Handle from the bitstream URL and inserting it into an item URL.
+
+       This is the same function as above, only instead of a URL, this returns
+       a unique URI that can be used to deduplicate HTML URLs where both
+       http and https protocols are present.
+
+    Parameters
+    ----------
+
+    bitstream_url:
+        The URL of a DSpace bitstream with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An item URI:
+        A locally unique URI of the HTML page ("item") that includes the bitstream.
+
+    """
+
+    p = urlparse(bitstream_url)
+
+    # Compile a regular expression to find the DSpace handle in the bitstream URL.
+    handle = re.compile("\/[0-9\?\.]+\/[0-9][0-9]+")
+
+    # Search the bitstream URL for the UI type.
+    xmlui = re.compile('xmlui')
+    jspui = re.compile('jspui')
+    dspace = re.compile('dspace')
+    h = handle.search(p.path)
+    x = xmlui.search(p.path)
+    j = jspui.search(p.path)
+    ds = dspace.search(p.path)
+
+    # Construct and return the item HTML page.
+    if h:
+        return h.group()
+
+
+def make_eprints_fedora_html_url(pdf_url):
+    """For EPrints and Fedora IR, generate a URL for an HTML page that contains a content file
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the URL of a file's parent HTML page
+       using the file's URL. For EPrints and Fedora IR this requires extracting the item's
+       internal ID number from the content file URL and inserting it into an item URL.
+       Note that for EPrints and Fedora IR, RAMP is currently only filtering activity
+       on PDF files, and does not filter activity on other content file types.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An HTML URL:
+        The URL of the HTML page ("item") that includes the PDF URL.
+
+    """
+
+    p = urlparse(pdf_url)
+
+    # Compile a regular expression to find the internal ID numberof the item.
+    pdf_path = re.compile("\/[0-9][0-9]+")
+    pdf_id = pdf_path.search(p.path)
+
+    # Construct and return the item HTML page.
+    if pdf_id:
+        return p.scheme + '://' + p.netloc + pdf_id.group()
+
+
+def make_eprints_fedora_item_uri(pdf_url):
+    """For EPrints and Fedora IR, generate a URL for an HTML page that contains a content file
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the URL of a file's parent HTML page
+       using the file's URL. For EPrints and Fedora IR this requires extracting the item's
+       internal ID number from the content file URL and inserting it into an item URL.
+       Note that for EPrints and Fedora IR, RAMP is currently only filtering activity
+       on PDF files, and does not filter activity on other content file types.
+
+       This is the same function as above, only instead of a URL, this returns
+       a unique URI that can be used to deduplicate HTML URLs where both
+       http and https protocols are present.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An item URI:
+        A locally unique URI of the HTML page ("item") that includes the PDF URL.
+
+    """
+
+    p = urlparse(pdf_url)
+
+    # Compile a regular expression to find the internal ID numberof the item.
+    pdf_path = re.compile("\/[0-9][0-9]+")
+    pdf_id = pdf_path.search(p.path)
+
+    # Construct and return the item HTML page.
+    if pdf_id:
+        return pdf_id.group()
+
+
+def make_fedora_ne_html_url(pdf_url):
+    """This function is the same as make_eprints_fedora_html_url,
+       but the regular expression is modified to include a
+       specific prefix present in all ID numbers.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An HTML URL:
+        The URL of the HTML page ("item") that includes the PDF URL.
+
+    """
+
+    p = urlparse(pdf_url)
+    pdf_path = re.compile("\/files\/neu:[a-z0-9]+")
+    pdf_id = pdf_path.search(p.path)
+    if pdf_id:
+        return p.scheme + '://' + p.netloc + pdf_id.group()
+
+
+def make_fedora_ne_item_uri(pdf_url):
+    """This function is the same as make_eprints_fedora_html_url,
+       but the regular expression is modified to include a
+       specific prefix present in all ID numbers.
+
+       This is the same function as above, only instead of a URL, this returns
+       a unique URI that can be used to deduplicate HTML URLs where both
+       http and https protocols are present.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An item URI:
+        A locally unique URI of the HTML page ("item") that includes the PDF URL.
+
+    """
+
+    p = urlparse(pdf_url)
+    pdf_path = re.compile("\/files\/neu:[a-z0-9]+")
+    pdf_id = pdf_path.search(p.path)
+    if pdf_id:
+        return pdf_id.group()
+
+
+def make_bepress_oai_url(pdf_url):
+    """For BePress Digital Commons IR, generate an OAI-PMH identifier (UID) for an item
+       that contains a content file
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the OAI-PMH UID of a file's parent HTML page
+       using the file's URL. For Digital Commons IR this requires extracting the item's
+       'context' and 'article' ID numbers from the content file URL and inserting
+       them into an OAI-PMH UID.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An OAI-PMH UID:
+        A UID that can be used to make an OAI-PMH request for the item that
+        contains the content file.
+
+    """
+
+    p = urlparse(pdf_url)
+    base_url = 'oai:' + p.netloc + ':'
+    contextRe = re.compile(r'context=([a-z0-9_\-]*)')
+    articleRe = re.compile(r'article=([0-9][0-9][0-9][0-9])')
+    contextSearch = contextRe.search(pdf_url)
+    articleSearch = articleRe.search(pdf_url)
+    if contextSearch:
+        if articleSearch:
+            context = contextSearch.group().replace('context=', '')
+            article = articleSearch.group().replace('article=', '')
+            return base_url + str(context) + '-' + str(article)
+
+
+def make_bepress_item_uri(pdf_url):
+    """For BePress Digital Commons IR, generate an OAI-PMH identifier (UID) for an item
+       that contains a content file
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the OAI-PMH UID of a file's parent HTML page
+       using the file's URL. For Digital Commons IR this requires extracting the item's
+       'context' and 'article' ID numbers from the content file URL and inserting
+       them into an OAI-PMH UID.
+
+       This is the same function as above, only instead of a URL, this returns
+       a unique URI that can be used to deduplicate HTML URLs where both
+       http and https protocols are present.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An OAI-PMH UID:
+        A locally unique UID that can be used to make an OAI-PMH request for the item that
+        contains the content file.
+
+    """
+
+    p = urlparse(pdf_url)
+    base_url = 'oai:' + p.netloc + ':'
+    contextRe = re.compile(r'context=([a-z0-9_\-]*)')
+    articleRe = re.compile(r'article=([0-9][0-9][0-9][0-9])')
+    contextSearch = contextRe.search(pdf_url)
+    articleSearch = articleRe.search(pdf_url)
+    if contextSearch:
+        if articleSearch:
+            context = contextSearch.group().replace('context=', '')
+            article = articleSearch.group().replace('article=', '')
+            return base_url + str(context) + '-' + str(article)
+
+
+# Regular expressions used by the make_*_item_urls functions, compiled once. Each
+# has one group, the part that is extracted, as in the scalar make_* functions.
+URL_PARTS_RE = re.compile(r'^(?:(?P<scheme>[A-Za-z][A-Za-z0-9+.\-]*):)?(?://(?P<netloc>[^/?#]*))?(?P<path>[^?#]*)')
+URL_PARAMS_RE = re.compile(r';[^/]*$')
+DSPACE_HANDLE_RE = re.compile(r"(/[0-9?.]+/[0-9][0-9]+)")
+EPRINTS_FEDORA_ID_RE = re.compile(r"(/[0-9][0-9]+)")
+FEDORA_NE_ID_RE = re.compile(r"(/files/neu:[a-z0-9]+)")
+BEPRESS_CONTEXT_RE = re.compile(r'context=([a-z0-9_\-]*)')
+BEPRESS_ARTICLE_RE = re.compile(r'article=([0-9][0-9][0-9][0-9])')
+
+
+def split_urls(urls):
+    """Splits a column of URLs into the scheme, network location and path, with
+       the same results as calling urlparse on each URL. The one exception is a
+       network location with unbalanced brackets, e.g. "http://[x.edu/1/23", for
+       which urlparse raises ValueError but the URL is split as written, so the
+       make_*_item_urls functions return an item URL where the scalar make_*
+       functions raise.
+
+    Parameters
+    ----------
+
+    urls:
+        A pandas series of URL strings, without missing values.
+
+    Returns
+    -------
+
+    parts:
+        A pandas data frame with the columns 'scheme', 'netloc' and 'path' and
+        the index of urls.
+
+    """
+
+    # urlparse drops tabs and line breaks, and leading control characters and spaces
+    urls = urls.str.replace(r'[\t\r\n]', '', regex=True).str.lstrip(''.join(map(chr, range(33))))
+    parts = urls.str.extract(URL_PARTS_RE).fillna('')
+    parts['scheme'] = parts['scheme'].str.lower()
+    # The ";params" of the last path segment are not part of the path
+    has_params = parts['scheme'].isin(uses_params)
+    parts['path'] = parts['path'].where(~has_params, parts['path'].str.replace(URL_PARAMS_RE, '', regex=True))
+    return parts
+
+
+def make_dspace_item_urls(bitstream_urls):
+    """The column-wise version of make_dspace_html_url and make_dspace_item_uri,
+       which parses each bitstream URL once for both.
+
+    Parameters
+    ----------
+
+    bitstream_urls:
+        A pandas series of DSpace bitstream URLs.
+
+    Returns
+    -------
+
+    item_urls:
+        A pandas data frame with the columns 'html_url' and 'unique_item_uri',
+        which are missing for URLs without a Handle.
+
+    """
+
+    p = split_urls(bitstream_urls)
+    handle = p['path'].str.extract(DSPACE_HANDLE_RE, expand=False)
+    # The UI type found first in make_dspace_html_url takes precedence
+    ui = pd.Series('', index=p.index)
+    for ui_type in ['dspace', 'xmlui', 'jspui']:
+        ui = ui.mask(p['path'].str.contains(ui_type, regex=False), ui_type + '/')
+    return pd.DataFrame({'html_url': p['scheme'] + '://' + p['netloc'] + '/' + ui + 'handle' + handle,
+                         'unique_item_uri': handle})
+
+
+def make_eprints_fedora_item_urls(pdf_urls):
+    """The column-wise version of make_eprints_fedora_html_url and
+       make_eprints_fedora_item_uri, which parses each content file URL once for both.
+
+    Parameters
+    ----------
+
+    pdf_urls:
+        A pandas series of EPrints or Fedora content file URLs.
+
+    Returns
+    -------
+
+    item_urls:
+        A pandas data frame with the columns 'html_url' and 'unique_item_uri',
+        which are missing for URLs without an item ID.
+
+    """
+
+    p = split_urls(pdf_urls)
+    pdf_id = p['path'].str.extract(EPRINTS_FEDORA_ID_RE, expand=False)
+    return pd.DataFrame({'html_url': p['scheme'] + '://' + p['netloc'] + pdf_id,
+                         'unique_item_uri': pdf_id})
+
+
+def make_fedora_ne_item_urls(pdf_urls):
+    """The column-wise version of make_fedora_ne_html_url and
+       make_fedora_ne_item_uri, which parses each content file URL once for both.
+
+    Parameters
+    ----------
+
+    pdf_urls:
+        A pandas series of Fedora/Samvera content file URLs.
+
+    Returns
+    -------
+
+    item_urls:
+        A pandas data frame with the columns 'html_url' and 'unique_item_uri',
+        which are missing for URLs without an item ID.
+
+    """
+
+    p = split_urls(pdf_urls)
+    pdf_id = p['path'].str.extract(FEDORA_NE_ID_RE, expand=False)
+    return pd.DataFrame({'html_url': p['scheme'] + '://' + p['netloc'] + pdf_id,
+                         'unique_item_uri': pdf_id})
+
+
+def make_bepress_item_urls(pdf_urls):
+    """The column-wise version of make_bepress_oai_url and make_bepress_item_uri,
+       which return the same OAI-PMH UID.
+
+    Parameters
+    ----------
+
+    pdf_urls:
+        A pandas series of Digital Commons content file URLs.
+
+    Returns
+    -------
+
+    item_urls:
+        A pandas data frame with the OAI-PMH UID in both the 'html_url' and the
+        'unique_item_uri' column, which are missing for URLs without a context
+        or an article.
+
+    """
+
+    # The context and article are searched for in the whole URL
+    context = pdf_urls.str.extract(BEPRESS_CONTEXT_RE, expand=False)
+    article = pdf_urls.str.extract(BEPRESS_ARTICLE_RE, expand=False)
+    oai_url = 'oai:' + split_urls(pdf_urls)['netloc'] + ':' + context + '-' + article
+    return pd.DataFrame({'html_url': oai_url, 'unique_item_uri': oai_url})
+
+
+# The function that builds the item URLs of a series of content file URLs, by IR software platform.
+ITEM_URL_BUILDERS = {
+    'DSpace': make_dspace_item_urls,
+    'EPrints 3': make_eprints_fedora_item_urls,
+    'Fedora/Samvera': make_fedora_ne_item_urls,
+    'Fedora': make_eprints_fedora_item_urls,
+    'Digital Commons': make_bepress_item_urls
+}
+
+
+def lookup_item_urls(urls, platform, index_file):
+    """Looks up the item URLs of distinct content file URLs in a persistent SQLite
+       index, and builds and adds those of URLs which are not in the index yet. Only
+       URLs not seen in earlier runs are normalized, whatever period is summarized.
+
+    Parameters
+    ----------
+
+    urls:
+        A pandas series of distinct content file URLs.
+    platform:
+        The IR software platform, a key of ITEM_URL_BUILDERS. URLs indexed under
+        another platform are built again and replaced.
+    index_file:
+        String. The path of the SQLite file, which is created if it doesn't exist.
+
+    Returns
+    -------
+
+    item_urls:
+        A pandas data frame with the columns 'html_url' and 'unique_item_uri',
+        in the order of urls, with a default index.
+
+    """
+
+    with closing(sqlite3.connect(index_file)) as conn, conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS item_urls "
+                     "(url TEXT PRIMARY KEY, platform TEXT, html_url TEXT, unique_item_uri TEXT)")
+        # Join the URLs against the index in bulk rather than querying them one by one
+        conn.execute("CREATE TEMP TABLE lookup_urls (url TEXT)")
+        conn.executemany("INSERT INTO lookup_urls VALUES (?)", zip(urls.tolist()))
+        item_urls = pd.read_sql_query("SELECT i.url IS NOT NULL AS known, i.html_url, i.unique_item_uri "
+                                      "FROM lookup_urls l LEFT JOIN item_urls i "
+                                      "ON i.url = l.url AND i.platform = ? ORDER BY l.rowid",
+                                      conn, params=(platform,))
+        new = (item_urls.pop('known') == 0).to_numpy()
+        if new.any():
+            new_urls = urls[new]
+            new_item_urls = ITEM_URL_BUILDERS[platform](new_urls).astype(object)
+            new_item_urls = new_item_urls.where(new_item_urls.notna(), None)
+            item_urls.loc[new, ['html_url', 'unique_item_uri']] = new_item_urls.to_numpy()
+            conn.executemany("INSERT OR REPLACE INTO item_urls VALUES (?, ?, ?, ?)",
+                             ((url, platform, html_url, item_uri) for url, (html_url, item_uri)
+                              in zip(new_urls.tolist(), new_item_urls.to_numpy().tolist())))
+    return item_urls
+
+
+def construct_html_urls(ir_data, platform, urls=None, url_index=None):
+    """This is a helper function that takes RAMP data for a single IR
+       and passes it to the appropriate function for building the
+       HTML URLs of item pages containing content files with positive click
+       values in RAMP.
+
+
+    Parameters
+    ----------
+
+    ir_data:
+        A pandas data frame containing RAMP data for a single IR.
+    platform:
+        The IR's software platform.
+    urls:
+        Optional. The content file URLs of ir_data, if its 'url' column holds
+        URL ids (see encode_urls). The 'url' column is used if not provided.
+    url_index:
+        Optional. The path of a SQLite file in which the item URLs of each URL
+        are kept across runs, see lookup_item_urls.
+
+    Returns
+    -------
+
+    ir_data:
+        The IR data is returned with two new columns, 'html_url' and
+        'unique_item_uri.' For each row,
+        this is the URL of the HTML page of the item containing the content
+        file URL referenced by the 'url' column in RAMP, and a URI that
+        can be used to deduplicate items which are present in the dataset
+        with both http and https URLs.
+
+    """
+
+    if urls is None:
+        urls = ir_data['url']
+    make_item_urls = ITEM_URL_BUILDERS.get(platform)
+    if make_item_urls is None:
+        return ir_data
+
+    # The same content file URL is in the data once for every day it was clicked,
+    # so each distinct URL is normalized once and mapped back by its category code.
+    urls = urls.astype('category')
+    if url_index is None:
+        item_urls = make_item_urls(pd.Series(urls.cat.categories))
+    else:
+        item_urls = lookup_item_urls(pd.Series(urls.cat.categories), platform, url_index)
+    item_urls = item_urls.reindex(urls.cat.codes)
+    ir_data['html_url'] = item_urls['html_url'].to_numpy()
+    ir_data['unique_item_uri'] = item_urls['unique_item_uri'].to_numpy()
+    return ir_data
+
+
+def select_ccd_rows(ramp_data, pc_indexes):
+    """Selects the citable content rows with positive clicks of the given IR.
+
+    Parameters
+    ----------
+
+    ramp_data:
+        A pandas data frame of RAMP page click data.
+    pc_indexes:
+        The page click index values of the IR to be selected.
+
+    Returns
+    -------
+
+    ccd_data:
+        A pandas data frame of the selected rows, with a default index.
+
+    """
+
+    return ramp_data[(ramp_data['citableContent'] == 'Yes') & (ramp_data['clicks'] > 0) &
+                     (ramp_data['index'].isin(pc_indexes))].reset_index(drop=True)
+
+
+def add_item_urls(ccd_data, urls, ir_platforms, url_index=None):
+    """Adds the item URLs to the RAMP data of many IR, building them once for
+       all IR on each platform with construct_html_urls.
+
+    Parameters
+    ----------
+
+    ccd_data:
+        A pandas data frame of RAMP data with a default index, as returned by
+        select_ccd_rows.
+    urls:
+        The content file URLs of ccd_data.
+    ir_platforms:
+        A pandas series of IR software platforms indexed by page click index.
+    url_index:
+        Optional. The path of a SQLite item URL index, see lookup_item_urls.
+
+    Returns
+    -------
+
+    ccd_data:
+        The data with the 'html_url' and 'unique_item_uri' columns, which are
+        missing for IR on platforms without an item URL builder.
+
+    """
+
+    ccd_data['html_url'] = None
+    ccd_data['unique_item_uri'] = None
+    row_platforms = ccd_data['index'].map(ir_platforms)
+    for platform, rows in ccd_data.groupby(row_platforms).indices.items():
+        platform_data = construct_html_urls(ccd_data.iloc[rows].copy(), platform, urls.iloc[rows], url_index)
+        if 'html_url' in platform_data:
+            ccd_data.loc[platform_data.index, ['html_url', 'unique_item_uri']] = \
+                platform_data[['html_url', 'unique_item_uri']]
+    return ccd_data
+
+
+# Summary statistics computed from the RAMP data by summarize_ir_clicks, in the
+# order of the RAMP_summary_stats output columns. Counts and sums are integers.
+CLICK_STATS_INT_COLUMNS = ['countCcdUrls', 'countItemUrls', 'countItemUris', 'sumCcd', 'ccdAggSum',
+                           'itemAggSum', 'serp1', 'serp1CcdSum', 'serp100', 'serp100CcdSum']
+DESCRIBE_SUFFIXES = {'count': 'Count', 'mean': 'Mean', 'std': 'Std', 'min': 'Min', '25%': '25',
+                     '50%': '50', '75%': '75', 'max': 'Max'}
+
+
+def describe_ir_clicks(clicks, prefix):
+    """Computes the sum and the pandas describe() statistics of per URL or per
+    item clicksums for all IR at once.
+
+    Parameters
+    ----------
+
+    clicks:
+        A pandas series of clicksums indexed by page click index and URL or item.
+    prefix:
+        The prefix of the output column names, e.g. 'ccdAgg'.
+
+    Returns
+    -------
+
+    stats:
+        A pandas data frame indexed by page click index, with the columns
+        prefix + 'Sum', 'Count', 'Mean', 'Std', 'Min', '25', '50', '75' and 'Max'.
+
+    """
+
+    by_ir = clicks.groupby(level=0)
+    stats = by_ir.describe().rename(columns=lambda stat: prefix + DESCRIBE_SUFFIXES[stat])
+    stats.insert(0, prefix + 'Sum', by_ir.sum())
+    return stats
+
+
+def summarize_ir_clicks(ccd_data, pc_indexes, distinct_counts=None):
+    """Computes the RAMP summary statistics of many IR in one pass, grouping the
+       clicks of all IR by their page click index instead of filtering the data
+       once per IR. The statistics are the same as those computed per IR by
+       earlier versions of RAMP-Summary.py.
+
+    Parameters
+    ----------
+
+    ccd_data:
+        A pandas data frame of the citable content rows with positive clicks of
+        all IR, with the 'html_url' and 'unique_item_uri' columns added by
+        construct_html_urls.
+    pc_indexes:
+        The page click index values of the IR to be summarized.
+    distinct_counts:
+        Optional. The countCcdUrls, countItemUrls and countItemUris of each IR,
+        e.g. estimated from sketches with estimate_distinct_counts, which are
+        then not counted from ccd_data.
+
+    Returns
+    -------
+
+    stats:
+        A pandas data frame indexed by page click index, with the columns
+        countCcdUrls, countItemUrls, countItemUris, sumCcd, the ccdAgg and
+        itemAgg statistics, serp1, serp1CcdSum, serp100 and serp100CcdSum.
+        IR without any rows have zero counts and sums, and missing describe
+        statistics.
+
+    """
+
+    ir_index = ccd_data['index']
+    by_ir = ccd_data.groupby(ir_index)
+    if distinct_counts is None:
+        distinct_counts = count_distinct_exact(ccd_data)
+    stats = distinct_counts.join(by_ir['clicks'].sum().rename('sumCcd'), how='outer')
+    url_clicks = ccd_data.groupby([ir_index, ccd_data['url']])['clicks'].sum()
+    stats = stats.join(describe_ir_clicks(url_clicks, 'ccdAgg'))
+    # Rows without an item URI are not included in the item statistics
+    item_clicks = ccd_data.groupby([ir_index, ccd_data['unique_item_uri']])['clicks'].sum()
+    stats = stats.join(describe_ir_clicks(item_clicks, 'itemAgg'))
+    for serp, max_position in [('serp1', 10), ('serp100', 1000)]:
+        on_serp = ccd_data['position'] <= max_position
+        stats[serp] = on_serp.groupby(ir_index).sum()
+        stats[serp + 'CcdSum'] = ccd_data['clicks'].where(on_serp, 0).groupby(ir_index).sum()
+    stats = stats.reindex(pd.Index(pc_indexes).unique())
+    stats[['ccdAggCount', 'itemAggCount']] = stats[['ccdAggCount', 'itemAggCount']].fillna(0.0)
+    stats[CLICK_STATS_INT_COLUMNS] = stats[CLICK_STATS_INT_COLUMNS].fillna(0).astype('int64')
+    return stats
+
+
+def summarize_ir_data(ir_record, ir_data, urls, distinct_counts=None):
+    """Adds the item URLs to the rows of a single IR and computes the IR's
+       statistics. This is the per IR version of add_item_urls and
+       summarize_ir_clicks, which summarize_ir runs in the worker processes of
+       map_ir_summaries so that the IR are normalized and summarized in parallel.
+
+    Parameters
+    ----------
+
+    ir_record:
+        A dictionary of the IR's row of RAMP_IR_base_info.csv.
+    ir_data:
+        A pandas data frame of the IR's rows of the data returned by select_ccd_rows.
+    urls:
+        The content file URLs of ir_data.
+    distinct_counts:
+        Optional. A dictionary of the IR's countCcdUrls, countItemUrls and
+        countItemUris, e.g. estimated from sketches, which are then not counted
+        from ir_data.
+
+    Returns
+    -------
+
+    ir_data, ir_stats:
+        The IR's data with the item URLs added, and a dictionary of the IR's
+        statistics, as computed by summarize_ir_clicks for all IR at once.
+
+    """
+
+    pc_index = ir_record['ir_page_click_index']
+    ir_data = construct_html_urls(ir_data, ir_record['Platform'], urls)
+    if distinct_counts is not None:
+        distinct_counts = pd.DataFrame(distinct_counts, index=pd.Index([pc_index], name='index'))
+    stats = summarize_ir_clicks(ir_data, [pc_index], distinct_counts)
+    return ir_data, {col: stats.at[pc_index, col] for col in stats.columns}
+
+
+def summarize_ir(ir_record, ir_stats, ir_data, urls, results_dir):
+    """Assembles the RAMP summary statistics of a single IR and writes the IR's
+       data to the results directory. This is the unit of work that
+       map_ir_summaries runs for each IR, possibly in a worker process, so it
+       only receives the IR's own rows and statistics.
+
+    Parameters
+    ----------
+
+    ir_record:
+        A dictionary of the IR's row of RAMP_IR_base_info.csv.
+    ir_stats:
+        A dictionary of the IR's statistics computed by summarize_ir_clicks, or
+        None if they are computed here from ir_data with summarize_ir_data. A
+        dictionary of only the distinct counts, e.g. estimated from sketches, is
+        passed on to summarize_ir_data.
+    ir_data:
+        A pandas data frame of the IR's rows of the data passed to
+        summarize_ir_clicks, or of the data returned by select_ccd_rows if the
+        statistics are computed here.
+    urls:
+        The content file URLs of ir_data, which are written instead of URL ids.
+    results_dir:
+        String. The directory to which the IR's data are written.
+
+    Returns
+    -------
+
+    row:
+        A dictionary of the IR's values of the RAMP_summary_stats output columns.
+
+    """
+
+    ir = ir_record['ir_index_root']
+    countItems = int(ir_record['Items in repository on 2019-05-27'])
+    if ir_record['Platform'] not in ITEM_URL_BUILDERS:
+        raise ValueError("No item URLs can be built for platform " + str(ir_record['Platform']))
+    if ir_stats is None or set(ir_stats) <= set(DISTINCT_COUNT_COLUMNS):
+        ir_data, ir_stats = summarize_ir_data(ir_record, ir_data, urls, ir_stats)
+    ir_data.assign(url=urls.to_numpy()).to_csv(results_dir + ir + "_ramp_data.csv", index=False)
+    row = {'ir': ir,
+           'pc_index': ir_record['ir_page_click_index'],
+           'ai_index': ir_record['ir_access_info_index'],
+           'inst': ir_record['Institution'],
+           'repoName': ir_record['Repository Name'],
+           'rURL': ir_record['URL'],
+           'countItems': countItems}
+    row.update(ir_stats)
+    row['useRatio'] = round(int(row['countItemUris']) / countItems, 2)
+    row['irCountry'] = ir_record['Country']
+    row['irType'] = ir_record['Type']
+    row['irPlat'] = ir_record['Platform']
+    row['normIrPlat'] = ir_record['Normalized_Platform']
+    row['ctMethod'] = ir_record['Item Count Method']
+    ctEtd = ir_record['ETD on 2019-06-07']
+    row['ctEtd'] = ctEtd
+    # Some IR don't have ETD
+    if ctEtd == '.':
+        row['pctEtd'] = '.'
+    else:
+        row['pctEtd'] = round(int(ctEtd) / countItems, 2)
+    row['gsSO'] = ir_record['GS site operator 2019-06-07']
+    return row
+
+
+def try_summarize_ir(ir_record, ir_stats, ir_data, urls, results_dir):
+    # The error is returned rather than raised, so that one IR doesn't stop the others
+    try:
+        return summarize_ir(ir_record, ir_stats, ir_data, urls, results_dir), None
+    except Exception as e:
+        return None, e
+
+
+def iter_ir_units(ir_records, ir_stats, ccd_data, urls):
+    """Yields the summarize_ir arguments of each IR, taking the IR's rows out of the
+    data of all IR only when the IR is reached, so that the rows of all IR are not
+    copied at once.
+
+    :param ir_records:
+        A list of dictionaries of the rows of RAMP_IR_base_info.csv.
+
+    :param ir_stats:
+        The statistics of all IR computed by summarize_ir_clicks. If None, each IR's
+        statistics are computed by summarize_ir from its rows. A data frame of
+        only the distinct counts, e.g. estimated from sketches, is passed on to
+        summarize_ir for each IR.
+
+    :param ccd_data:
+        The data passed to summarize_ir_clicks, or the data returned by
+        select_ccd_rows if ir_stats is None, with a default index.
+
+    :param urls:
+        The content file URLs of ccd_data.
+
+    :return units:
+        A generator of (ir_record, ir_stats, ir_data, urls) tuples, in the order
+        of ir_records.
+    """
+    ir_rows = ccd_data.groupby('index').indices
+    for ir_record in ir_records:
+        pc_index = ir_record['ir_page_click_index']
+        ir_rows_pos = ir_rows.get(pc_index, [])
+        if ir_stats is None:
+            unit_stats = None
+        elif pc_index in ir_stats.index:
+            unit_stats = {col: ir_stats.at[pc_index, col] for col in ir_stats.columns}
+        else:
+            # Only distinct counts can be missing for an IR, which has none then
+            unit_stats = {col: 0 for col in ir_stats.columns}
+        yield ir_record, unit_stats, ccd_data.iloc[ir_rows_pos], urls.iloc[ir_rows_pos]
+
+
+def map_ir_summaries(units, results_dir, workers=None):
+    """Runs summarize_ir for each IR and yields the results in the order of the
+    IR. If more than one worker is requested, the IR are summarized in parallel on
+    a pool of worker processes, each receiving only its IR's rows. On Windows,
+    scripts that use workers must make their calls under 'if __name__ == "__main__":'.
+
+    With workers, the units should leave the statistics to summarize_ir (see
+    iter_ir_units), so that the item URLs and statistics of the IR are computed
+    in the worker processes. Serially, computing them for all IR at once with
+    add_item_urls and summarize_ir_clicks is faster.
+
+    :param units:
+        An iterable of (ir_record, ir_stats, ir_data, urls) tuples, one per IR,
+        see summarize_ir and iter_ir_units. Units are taken from it as they are
+        run, at most two per worker ahead of the results.
+
+    :param results_dir:
+        The directory to which the data of each IR are written.
+
+    :param workers:
+        The number of worker processes. IR are summarized serially if None or 1.
+
+    :return results:
+        A generator of (row, error) tuples in the order of units, where row is
+        None and error is the exception if summarize_ir failed for the IR.
+    """
+    run_unit = partial(try_summarize_ir, results_dir=results_dir)
+    if workers is None or workers < 2:
+        for unit in units:
+            yield run_unit(*unit)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for unit in units:
+            pending.append(executor.submit(run_unit, *unit))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# The number of register index bits of the HyperLogLog sketches. 2 ** 14 registers
+# give distinct counts with a standard error of about 1.04 / sqrt(2 ** 14) = 0.8%.
+HLL_PRECISION = 14
+# The distinct counts that can be estimated from sketches, and the column counted.
+DISTINCT_COUNT_COLUMNS = {'countCcdUrls': 'url', 'countItemUrls': 'html_url', 'countItemUris': 'unique_item_uri'}
+
+
+def get_bit_length(values):
+    """Counts the bits needed to represent each value, by halving the shift until
+    all bits are counted, since numpy has no bit length function.
+
+    :param values:
+        A numpy array of unsigned 64 bit integers.
+
+    :return bit_length:
+        A numpy array of the number of bits needed to represent each value.
+    """
+    bit_length = np.zeros(len(values), dtype=np.uint8)
+    for shift in [32, 16, 8, 4, 2, 1]:
+        high = values >= np.uint64(1 << shift)
+        bit_length[high] += shift
+        values = np.where(high, values >> np.uint64(shift), values)
+    return bit_length + (values > 0)
+
+
+def sketch_distinct_counts(ccd_data, urls=None):
+    """Builds HyperLogLog sketches of the distinct URLs, item URLs and item URIs of
+       each IR in some RAMP data, usually a month. Sketches of different months are
+       combined with merge_distinct_sketches, so distinct counts over any range of
+       months can be estimated without reading the RAMP data of those months again.
+
+    Parameters
+    ----------
+
+    ccd_data:
+        A pandas data frame of RAMP data with the item URLs added by add_item_urls.
+    urls:
+        Optional. The content file URLs of ccd_data, if its 'url' column holds
+        URL ids. URLs are hashed rather than ids, since ids are only stable as
+        long as the URL dictionary is kept.
+
+    Returns
+    -------
+
+    sketch:
+        A pandas data frame with the columns 'index', 'measure', 'register' and
+        'rank', with one row per nonzero register of each IR and distinct count
+        in DISTINCT_COUNT_COLUMNS. Missing values are counted as one value, as
+        in summarize_ir_clicks.
+
+    """
+
+    value_bits = 64 - HLL_PRECISION
+    sketches = []
+    for measure, column in DISTINCT_COUNT_COLUMNS.items():
+        values = ccd_data[column] if column != 'url' or urls is None else urls
+        hashes = pd.util.hash_array(values.to_numpy(dtype=object))
+        # The first bits of the hash pick the register, the position of the first
+        # one bit in the rest is its rank
+        ranks = pd.DataFrame({'index': ccd_data['index'].to_numpy(), 'measure': measure,
+                              'register': (hashes >> np.uint64(value_bits)).astype(np.int16),
+                              'rank': value_bits + 1 - get_bit_length(hashes & np.uint64((1 << value_bits) - 1))})
+        sketches.append(ranks)
+    return merge_distinct_sketches(sketches)
+
+
+def merge_distinct_sketches(sketches):
+    """Merges sketches, e.g. of several months, by keeping the highest rank of
+       each register.
+
+    Parameters
+    ----------
+
+    sketches:
+        A list of sketches returned by sketch_distinct_counts.
+
+    Returns
+    -------
+
+    sketch:
+        The sketch of the distinct values of all sketches.
+
+    """
+
+    sketch = pd.concat(sketches, ignore_index=True)
+    return sketch.groupby(['index', 'measure', 'register'], sort=False)['rank'].max().reset_index()
+
+
+def estimate_distinct_counts(sketch):
+    """Estimates the distinct counts of each IR from a sketch, with the HyperLogLog
+       estimator and linear counting for small counts.
+
+    Parameters
+    ----------
+
+    sketch:
+        A sketch returned by sketch_distinct_counts or merge_distinct_sketches.
+
+    Returns
+    -------
+
+    counts:
+        A pandas data frame of integer counts indexed by page click index, with
+        the columns of DISTINCT_COUNT_COLUMNS.
+
+    """
+
+    m = 2 ** HLL_PRECISION
+    alpha = 0.7213 / (1 + 1.079 / m)
+    by_sketch = sketch.groupby(['index', 'measure'])
+    zeros = m - by_sketch.size()
+    # Zero registers add 2 ** 0 each to the harmonic sum
+    harmonic_sum = (2.0 ** -sketch['rank'].astype('float64')).groupby([sketch['index'], sketch['measure']]).sum()
+    counts = alpha * m * m / (harmonic_sum + zeros)
+    linear_counts = m * np.log(m / zeros.where(zeros > 0))
+    counts = counts.where((counts > 2.5 * m) | (zeros == 0), linear_counts)
+    counts = counts.round().astype('int64').unstack('measure', fill_value=0)
+    return counts.reindex(columns=list(DISTINCT_COUNT_COLUMNS), fill_value=0)
+
+
+def count_distinct_exact(ccd_data):
+    """Counts the distinct URLs, item URLs and item URIs of each IR exactly, for
+       validating estimate_distinct_counts.
+
+    Parameters
+    ----------
+
+    ccd_data:
+        A pandas data frame of RAMP data with the item URLs added by add_item_urls.
+
+    Returns
+    -------
+
+    counts:
+        A pandas data frame of integer counts indexed by page click index, with
+        the columns of DISTINCT_COUNT_COLUMNS.
+
+    """
+
+    by_ir = ccd_data.groupby('index')
+    return pd.DataFrame({measure: by_ir[column].nunique(dropna=False)
+                         for measure, column in DISTINCT_COUNT_COLUMNS.items()})
+
+
+def get_sketch_file(data_file, sketch_dir):
+    """Names the sketch file of a monthly RAMP data file after the data file.
+
+    :param data_file:
+        A path to a monthly RAMP data file.
+
+    :param sketch_dir:
+        The directory of the sketches.
+
+    :return sketch_file:
+        The path of the month's sketch file.
+    """
+    stem = os.path.splitext(os.path.basename(data_file))[0]
+    return os.path.join(sketch_dir, stem + ".sketch.parquet")
+
+
+def write_distinct_sketch(sketch, sketch_file):
+    # Written to a temporary file first, so that a sketch is never half written
+    os.makedirs(os.path.dirname(sketch_file), exist_ok=True)
+    sketch.to_parquet(sketch_file + ".tmp", index=False)
+    os.replace(sketch_file + ".tmp", sketch_file)
+    return
+
+
+def read_distinct_sketches(sketch_files):
+    """Reads the sketches written by write_distinct_sketch and merges them into one.
+
+    :param sketch_files:
+        A list of paths to sketch files, e.g. of the months of a period.
+
+    :return sketch:
+        The merged sketch of all files.
+    """
+    return merge_distinct_sketches([pd.read_parquet(sketch_file) for sketch_file in sketch_files])
+
+
+def get_sketch_key(ir_info):
+    """Fingerprints the IR info that the sketches of a month are built with, since
+    the rows and item URLs sketched depend on the page click indexes and the
+    platforms of the IR.
+
+    :param ir_info:
+        A pandas data frame of RAMP_IR_base_info.csv.
+
+    :return sketch_key:
+        A SHA-256 hex digest of the page click index and platform of each IR.
+    """
+    ir_platforms = ir_info[['ir_page_click_index', 'Platform']].drop_duplicates()
+    ir_platforms = ir_platforms.sort_values(['ir_page_click_index', 'Platform'])
+    return hashlib.sha256(ir_platforms.to_csv(index=False).encode('utf-8')).hexdigest()
+
+
+def get_stale_sketch_files(file_list, manifest, sketch_key, sketch_dir):
+    """Finds the monthly RAMP data files whose sketches have to be (re)built, since
+    the file is new or has changed, the IR info has changed, or the sketch file
+    is missing.
+
+    :param file_list:
+        A list of paths to monthly RAMP data files.
+
+    :param manifest:
+        A manifest dictionary, see aggregation_helpers.load_manifest. Updated in place.
+
+    :param sketch_key:
+        The fingerprint of the current IR info, see get_sketch_key.
+
+    :param sketch_dir:
+        The directory of the sketches.
+
+    :return stale_files:
+        A list of the files to be sketched, in file_list order.
+    """
+    changed_files = set(get_changed_files(file_list, manifest, 'distinct_sketches'))
+    sketched = manifest['outputs'].get('distinct_sketches', {})
+    return [f for f in file_list if f in changed_files or sketched[f].get('sketch_key') != sketch_key
+            or not os.path.exists(get_sketch_file(f, sketch_dir))]
+
+
+def record_distinct_sketch(manifest, data_file, sketch_key):
+    # The sketch of data_file must have been written with write_distinct_sketch
+    record_ingested_file(manifest, 'distinct_sketches', data_file, sketch_key=sketch_key)
+    return
+
+
+def list_sketch_files(manifest, sketch_key, sketch_dir, start=None, end=None):
+    """Lists the stored sketches of the months in a date range, so that distinct
+    counts over those months can be estimated with read_distinct_sketches
+    without reading their RAMP data. Sketches built with other IR info are left
+    out.
+
+    :param manifest:
+        A manifest dictionary, see aggregation_helpers.load_manifest.
+
+    :param sketch_key:
+        The fingerprint of the current IR info, see get_sketch_key.
+
+    :param sketch_dir:
+        The directory of the sketches.
+
+    :param start:
+        Optional. The first date of the range. The range is open-ended if None.
+
+    :param end:
+        Optional. The last date of the range. The range is open-ended if None.
+
+    :return sketch_files:
+        A sorted list of the paths of the sketch files.
+    """
+    sketched = manifest['outputs'].get('distinct_sketches', {})
+    sketch_files = []
+    for data_file in sorted(sketched):
+        month = get_ramp_month(data_file)
+        if sketched[data_file].get('sketch_key') != sketch_key or month is None \
+                or not month_in_range(month, start, end):
+            continue
+        sketch_files.append(get_sketch_file(data_file, sketch_dir))
+    return sketch_files
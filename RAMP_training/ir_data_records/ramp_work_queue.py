@@ -0,0 +1,382 @@
+"""A work queue in a shared directory, for spreading the monthly extraction of
+RAMP data over several hosts without a broker service.
+
+A coordinator submits one work unit per monthly file with submit_work. Workers
+on any host that mounts the queue directory and the archive claim units by
+atomically renaming them from todo/ to claimed/, write each result as a CSV
+partial next to the claim, and then move the claim to done/. A worker touches
+its claim while the unit runs, so that only claims of workers that stopped are
+requeued. The coordinator reads the partials back in submission order with
+collect_work.
+
+    queue_dir/todo/<unit>.json       submitted, not claimed yet
+    queue_dir/claimed/<unit>.json    claimed by a worker, see the "worker" key
+    queue_dir/claimed/<unit>.csv     the finished partial
+    queue_dir/done/<unit>.json       finished
+    queue_dir/failed/<unit>.json     the worker raised an error, see "error"
+
+Zip file paths are stored as given, so all hosts must run from a directory in
+which the paths resolve to the same archive. Start a worker on each host with
+
+    python ramp_work_queue.py <queue_dir> [<wait>]
+
+where the optional wait is the number of seconds a worker keeps polling an
+empty queue before it exits, see run_worker.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import pandas as pd
+from threading import Thread, Event
+from aggregation_helpers import get_ramp_family, read_ramp_csv, extract_daily_pc_clicks, \
+    extract_daily_ai_clicks, extract_subset_ramp_data
+
+
+# Functions that may be run by workers, by name. A work unit calls one of them
+# with a zip file path and the keyword arguments given to submit_work.
+WORK_FUNCTIONS = {
+    "extract_daily_pc_clicks": extract_daily_pc_clicks,
+    "extract_daily_ai_clicks": extract_daily_ai_clicks,
+    "extract_subset_ramp_data": extract_subset_ramp_data
+}
+
+QUEUE_STATES = ["todo", "claimed", "done", "failed"]
+
+
+def get_unit_name(func_name, zip_file, kwargs):
+    """Names the work unit that applies a function to a monthly file. The name
+    includes a hash of the keyword arguments, so the same month can be queued
+    for e.g. several repositories.
+
+    :param func_name:
+        A key of WORK_FUNCTIONS.
+
+    :param zip_file:
+        A path to a zipped monthly RAMP data file.
+
+    :param kwargs:
+        A dictionary of keyword arguments for the function.
+
+    :return unit:
+        A file name stem, e.g. "extract_daily_pc_clicks-2019-01_RAMP_all_page-clicks-1a2b3c4d".
+    """
+    stem = os.path.splitext(os.path.basename(zip_file))[0]
+    kwargs_hash = hashlib.sha1(json.dumps(kwargs, sort_keys=True).encode()).hexdigest()[:8]
+    return func_name + "-" + stem + "-" + kwargs_hash
+
+
+def get_worker_id():
+    # Identifies the worker process that owns a claim, across hosts
+    return socket.gethostname() + ":" + str(os.getpid())
+
+
+def get_temp_file(out_file):
+    # Each worker writes its own temporary file, so that two workers running the
+    # same unit never write to the same file
+    return out_file + "." + get_worker_id().replace(":", "-") + ".tmp"
+
+
+def write_json_atomic(obj, out_file):
+    # Other hosts only ever see a complete file
+    temp_file = get_temp_file(out_file)
+    with open(temp_file, "w") as f:
+        json.dump(obj, f, indent=1)
+    os.replace(temp_file, out_file)
+    return
+
+
+def read_claim(claim_file):
+    # None if the claim has been requeued or moved on
+    try:
+        with open(claim_file) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def owns_claim(claim_file, worker):
+    task = read_claim(claim_file)
+    return task is not None and task.get("worker") == worker
+
+
+def keep_claim(claim_file, worker, stop, heartbeat):
+    # Touches the claim every heartbeat seconds until stop is set, or until the
+    # claim is requeued or taken over by another worker
+    while not stop.wait(heartbeat):
+        if not owns_claim(claim_file, worker):
+            return
+        try:
+            os.utime(claim_file)
+        except FileNotFoundError:
+            return
+
+
+def submit_work(queue_dir, func_name, file_list, **kwargs):
+    """Submits one work unit per monthly file. Units that are already queued,
+    claimed or done are not submitted again, so a coordinator can be restarted.
+    Failed units are moved back to todo/ to be retried.
+
+    :param queue_dir:
+        The shared queue directory.
+
+    :param func_name:
+        A key of WORK_FUNCTIONS, e.g. "extract_daily_pc_clicks".
+
+    :param file_list:
+        A list of paths to zipped monthly RAMP data files.
+
+    :param kwargs:
+        Keyword arguments passed to the function with each file. Must be JSON
+        serializable, e.g. ir_repo_id="montana_state_university".
+
+    :return units:
+        A list of the unit names, in file_list order, for collect_work.
+    """
+    for state in QUEUE_STATES:
+        os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+    units = []
+    for zip_file in file_list:
+        unit = get_unit_name(func_name, zip_file, kwargs)
+        units.append(unit)
+        failed_file = os.path.join(queue_dir, "failed", unit + ".json")
+        if os.path.exists(failed_file):
+            try:
+                os.rename(failed_file, os.path.join(queue_dir, "todo", unit + ".json"))
+            except FileNotFoundError:
+                # Another coordinator retried it first
+                pass
+            continue
+        if any(os.path.exists(os.path.join(queue_dir, state, unit + ".json")) for state in QUEUE_STATES):
+            continue
+        write_json_atomic({"func": func_name, "zip_file": zip_file, "kwargs": kwargs},
+                          os.path.join(queue_dir, "todo", unit + ".json"))
+    return units
+
+
+def claim_work(queue_dir):
+    """Claims the next unclaimed work unit. The claim is an atomic rename from
+    todo/ to claimed/, so each unit is claimed by exactly one worker, even
+    across hosts sharing the directory over NFS. The worker is recorded in the
+    claim under the "worker" key.
+
+    :param queue_dir:
+        The shared queue directory.
+
+    :return unit:
+        The name of the claimed unit, or None if there is nothing left to claim.
+    """
+    for unit_file in sorted(os.listdir(os.path.join(queue_dir, "todo"))):
+        if not unit_file.endswith(".json"):
+            continue
+        claim_file = os.path.join(queue_dir, "claimed", unit_file)
+        try:
+            os.rename(os.path.join(queue_dir, "todo", unit_file), claim_file)
+        except FileNotFoundError:
+            # Another worker claimed it first
+            continue
+        try:
+            # Renaming keeps the old modification time; it now marks the claim
+            os.utime(claim_file)
+        except FileNotFoundError:
+            # Requeued before it was touched
+            continue
+        task = read_claim(claim_file)
+        if task is None:
+            continue
+        task["worker"] = get_worker_id()
+        write_json_atomic(task, claim_file)
+        return unit_file[:-len(".json")]
+    return None
+
+
+def run_work(queue_dir, unit, heartbeat=60):
+    """Runs a claimed work unit, writes its result as a CSV partial next to the
+    claim, and moves the claim to done/, or to failed/ with the error message if
+    the function raises an exception. The claim is touched while the unit runs.
+    If it is lost in the meantime, i.e. requeued and possibly claimed by another
+    worker, nothing is published and the unit is left to that worker.
+
+    :param queue_dir:
+        The shared queue directory.
+
+    :param unit:
+        The name of a unit claimed with claim_work.
+
+    :param heartbeat:
+        The number of seconds between touches of the claim. Must be well below the
+        max_age of requeue_stale_claims.
+
+    :return succeeded:
+        True if the unit is done, False if it failed, None if the claim was lost.
+    """
+    claim_file = os.path.join(queue_dir, "claimed", unit + ".json")
+    worker = get_worker_id()
+    task = read_claim(claim_file)
+    if task is None or task.get("worker") != worker:
+        return None
+    # The error of an earlier, failed run
+    task.pop("error", None)
+    error = None
+    partial_file = os.path.join(queue_dir, "claimed", unit + ".csv")
+    temp_file = get_temp_file(partial_file)
+    stop = Event()
+    heartbeat_thread = Thread(target=keep_claim, args=(claim_file, worker, stop, heartbeat), daemon=True)
+    heartbeat_thread.start()
+    try:
+        result = WORK_FUNCTIONS[task["func"]](task["zip_file"], **task["kwargs"])
+        result.to_csv(temp_file, index=False)
+    except Exception as e:
+        error = repr(e)
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+    lost = not owns_claim(claim_file, worker)
+    if (lost or error is not None) and os.path.exists(temp_file):
+        os.remove(temp_file)
+    if lost:
+        # Requeued, e.g. while this host was suspended, and left to the worker
+        # that claims it again
+        return None
+    if error is not None:
+        task["error"] = error
+        write_json_atomic(task, claim_file)
+        os.replace(claim_file, os.path.join(queue_dir, "failed", unit + ".json"))
+        return False
+    os.replace(temp_file, partial_file)
+    write_json_atomic(task, claim_file)
+    os.replace(claim_file, os.path.join(queue_dir, "done", unit + ".json"))
+    return True
+
+
+def run_worker(queue_dir, wait=None, poll_interval=5, heartbeat=60):
+    """Claims and runs work units until none are left to claim.
+
+    :param queue_dir:
+        The shared queue directory.
+
+    :param wait:
+        Optional. Keep polling for this many seconds after todo/ is found empty,
+        so that units requeued by requeue_stale_claims or collect_work after the
+        other workers exited are still run. The wait starts again after each
+        unit. The worker exits as soon as todo/ is empty if None.
+
+    :param poll_interval:
+        The number of seconds to wait between checks of the queue while waiting.
+
+    :param heartbeat:
+        The number of seconds between touches of a claim, see run_work.
+
+    :return count:
+        The number of units this worker finished or failed, not counting units
+        whose claim was lost.
+    """
+    count = 0
+    idle_since = time.time()
+    while True:
+        unit = claim_work(queue_dir)
+        if unit is None:
+            if wait is None or time.time() - idle_since >= wait:
+                return count
+            time.sleep(poll_interval)
+            continue
+        print(unit)
+        if run_work(queue_dir, unit, heartbeat) is not None:
+            count += 1
+        idle_since = time.time()
+
+
+def requeue_stale_claims(queue_dir, max_age=3600):
+    """Moves claims that have not been touched within a time limit back to todo/,
+    e.g. after a worker host went down. Workers touch their claims every heartbeat
+    seconds while a unit runs (see run_work), so the time limit should be several
+    heartbeats, regardless of the time it takes to process the largest month.
+
+    :param queue_dir:
+        The shared queue directory.
+
+    :param max_age:
+        The number of seconds since a claim was last touched after which it is
+        requeued.
+
+    :return units:
+        A list of the requeued unit names.
+    """
+    units = []
+    now = time.time()
+    for unit_file in os.listdir(os.path.join(queue_dir, "claimed")):
+        claim_file = os.path.join(queue_dir, "claimed", unit_file)
+        if not unit_file.endswith(".json") or now - os.path.getmtime(claim_file) < max_age:
+            continue
+        try:
+            os.rename(claim_file, os.path.join(queue_dir, "todo", unit_file))
+        except FileNotFoundError:
+            # The worker finished in the meantime
+            continue
+        units.append(unit_file[:-len(".json")])
+    return units
+
+
+def read_partial(queue_dir, unit):
+    """Reads the CSV partial of a finished work unit, restoring the column types
+    of the function's output.
+
+    :param queue_dir:
+        The shared queue directory.
+
+    :param unit:
+        The name of a finished unit.
+
+    :return partial:
+        A pandas dataframe.
+    """
+    with open(os.path.join(queue_dir, "done", unit + ".json")) as f:
+        task = json.load(f)
+    partial_file = os.path.join(queue_dir, "claimed", unit + ".csv")
+    if task["func"] == "extract_subset_ramp_data":
+        columns = task["kwargs"].get("columns")
+        if columns is not None and "repository_id" not in columns:
+            columns = columns + ["repository_id"]
+        return read_ramp_csv(partial_file, get_ramp_family(task["zip_file"]), columns)
+    # The daily clicksums keep country codes such as "NA" as they are
+    partial = pd.read_csv(partial_file, keep_default_na=False)
+    partial["date"] = pd.to_datetime(partial["date"])
+    return partial
+
+
+def collect_work(queue_dir, units, poll_interval=5, max_age=None):
+    """Waits until a list of work units is finished and reads their partials.
+
+    :param queue_dir:
+        The shared queue directory.
+
+    :param units:
+        A list of unit names, as returned by submit_work.
+
+    :param poll_interval:
+        The number of seconds to wait between checks of the queue.
+
+    :param max_age:
+        Optional. Requeue claims older than this many seconds while waiting,
+        see requeue_stale_claims.
+
+    :return partials:
+        A list of pandas dataframes, in the order of units. Raises a
+        RuntimeError if any of the units failed.
+    """
+    while True:
+        failed = [unit for unit in units if os.path.exists(os.path.join(queue_dir, "failed", unit + ".json"))]
+        if failed:
+            raise RuntimeError("Failed work units in " + queue_dir + ": " + ", ".join(failed))
+        if all(os.path.exists(os.path.join(queue_dir, "done", unit + ".json")) for unit in units):
+            return [read_partial(queue_dir, unit) for unit in units]
+        if max_age is not None:
+            requeue_stale_claims(queue_dir, max_age)
+        time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    run_worker(sys.argv[1], wait=float(sys.argv[2]) if len(sys.argv) > 2 else None)
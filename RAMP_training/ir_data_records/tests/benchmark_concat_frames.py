@@ -0,0 +1,52 @@
+"""Times collecting the monthly subsets of one IR over several years by growing
+a dataframe with a concat per month, as get_ir_data and the month loops did
+with DataFrame.append before concat_frames, and with concat_frames, and checks
+both give the same frame. Not collected by pytest, run with
+
+    python tests/benchmark_concat_frames.py [rows]
+
+where rows, the number of rows of each monthly part, defaults to 20000."""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aggregation_helpers import concat_frames
+
+
+def make_months(count, rows):
+    rng = np.random.default_rng(0)
+    return [pd.DataFrame({"date": pd.Timestamp("2018-01-01") + pd.DateOffset(months=month),
+                          "url": rng.integers(0, 100000, rows).astype(str),
+                          "clicks": rng.integers(1, 10, rows),
+                          "impressions": rng.integers(1, 100, rows),
+                          "position": rng.random(rows) * 10})
+            for month in range(count)]
+
+
+def grow_frame(frames):
+    combined = pd.DataFrame()
+    for frame in frames:
+        combined = pd.concat([combined, frame]) if len(combined) else frame
+    return combined
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print("rows per month:", rows)
+    for years in [1, 2, 4, 8]:
+        months = make_months(12 * years, rows)
+        expected, grow_time = time_call(grow_frame, months)
+        combined, concat_time = time_call(concat_frames, months)
+        pd.testing.assert_frame_equal(combined, expected)
+        print("%d years: growing %.3fs, concat_frames %.3fs, %.1fx" %
+              (years, grow_time, concat_time, grow_time / concat_time))
@@ -0,0 +1,47 @@
+"""Times the item URLs of the content file URLs of each platform with the
+scalar make_* functions applied per URL, as construct_html_urls did before the
+column-wise make_*_item_urls functions, and with those. Not collected by pytest,
+run with
+
+    python tests/benchmark_item_urls.py [urls]
+
+where urls, the number of content file URLs per platform, defaults to 200000."""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ramp_summary_helpers import *
+from test_item_urls import BUILDERS
+
+# Content file URL patterns of each platform, formatted with a random item number
+URL_PATTERNS = {
+    make_dspace_item_urls: "https://ir.edu/xmlui/bitstream/handle/1/{0}/file1.pdf?sequence=1",
+    make_eprints_fedora_item_urls: "https://ir.ac.uk/{0}/1/paper1.pdf",
+    make_fedora_ne_item_urls: "https://ir.edu/files/neu:a{0}",
+    make_bepress_item_urls: "https://ir.edu/cgi/viewcontent.cgi?article={0:04d}&context=ctx_a"
+}
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rng = np.random.default_rng(0)
+    print("urls:", count)
+    for builder, make_html_url, make_item_uri in BUILDERS:
+        urls = pd.Series([URL_PATTERNS[builder].format(i) for i in rng.integers(0, 10000, count)])
+        (html_urls, item_uris), scalar_time = time_call(
+            lambda u: (u.apply(make_html_url), u.apply(make_item_uri)), urls)
+        item_urls, builder_time = time_call(builder, urls)
+        assert item_urls["html_url"].tolist() == html_urls.tolist()
+        assert item_urls["unique_item_uri"].tolist() == item_uris.tolist()
+        print("%s: scalar %.3fs, column-wise %.3fs, %.1fx" %
+              (builder.__name__, scalar_time, builder_time, scalar_time / builder_time))
@@ -0,0 +1,36 @@
+"""Times the daily clicksums of a full month of RAMP "all" data with the
+per-group loops that sum_clicks_by replaced, and checks both give the same sums.
+Not collected by pytest, run with
+
+    python tests/benchmark_sum_clicks_by.py [rows]
+
+where rows defaults to 3000000, about the size of a monthly "all" file."""
+
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aggregation_helpers import sum_clicks_by, RAMP_SCHEMAS
+from test_sum_clicks_by import make_month, previous_daily_pc_clicks, previous_daily_ai_clicks
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 3000000
+    ramp_df = make_month(rows).astype({col: dtype for col, dtype in RAMP_SCHEMAS["all"].items()
+                                       if dtype == "category"})
+    print("rows:", rows)
+    for kind, keys, previous in [("pc", ["date"], previous_daily_pc_clicks),
+                                 ("ai", ["date", "country", "device"], previous_daily_ai_clicks)]:
+        expected, loop_time = time_call(previous, ramp_df)
+        daily_clicks, sum_time = time_call(sum_clicks_by, ramp_df, keys)
+        pd.testing.assert_frame_equal(daily_clicks, expected, check_dtype=False)
+        print("%s: %d groups, loop %.3fs, sum_clicks_by %.3fs, %.1fx" %
+              (kind, len(daily_clicks), loop_time, sum_time, loop_time / sum_time))
@@ -0,0 +1,10 @@
+"""Makes the modules in ir_data_records importable by the tests, which are run
+from the ir_data_records directory with
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
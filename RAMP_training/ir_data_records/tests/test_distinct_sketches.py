@@ -0,0 +1,118 @@
+"""Tests of the distinct count sketches kept per month by RAMP-Summary.py."""
+
+import os
+import numpy as np
+import pandas as pd
+from aggregation_helpers import load_manifest
+from ramp_summary_helpers import *
+
+IR_INFO = pd.DataFrame({"ir_page_click_index": ["a_page_clicks", "b_page_clicks"],
+                        "Platform": ["DSpace", "EPrints 3"]})
+
+
+def write_month(tmp_path, name):
+    data_file = str(tmp_path / name)
+    with open(data_file, "w") as f:
+        f.write("url,clicks\n")
+    return data_file
+
+
+def sketch_months(data_files, manifest, sketch_key, sketch_dir):
+    for data_file in data_files:
+        write_distinct_sketch(pd.DataFrame({"index": [], "measure": [], "register": [], "rank": []}),
+                              get_sketch_file(data_file, sketch_dir))
+        record_distinct_sketch(manifest, data_file, sketch_key)
+
+
+def test_sketches_are_stale_when_the_ir_info_changes(tmp_path):
+    sketch_dir = str(tmp_path / "sketches")
+    data_files = [write_month(tmp_path, "2019-01_RAMP_subset_page-clicks_v2.csv"),
+                  write_month(tmp_path, "2019-02_RAMP_subset_page-clicks_v2.csv")]
+    manifest = load_manifest(str(tmp_path / "manifest.json"))
+    sketch_key = get_sketch_key(IR_INFO)
+    assert get_stale_sketch_files(data_files, manifest, sketch_key, sketch_dir) == data_files
+    sketch_months(data_files, manifest, sketch_key, sketch_dir)
+    assert get_stale_sketch_files(data_files, manifest, sketch_key, sketch_dir) == []
+    # Reordered IR info gives the same key, other platforms don't
+    assert get_sketch_key(IR_INFO.iloc[::-1]) == sketch_key
+    new_key = get_sketch_key(IR_INFO.assign(Platform=["DSpace", "Fedora"]))
+    assert get_stale_sketch_files(data_files, manifest, new_key, sketch_dir) == data_files
+    # A rewritten month or a missing sketch is stale too
+    with open(data_files[0], "a") as f:
+        f.write("https://a.edu/1/23,1\n")
+    os.remove(get_sketch_file(data_files[1], sketch_dir))
+    assert get_stale_sketch_files(data_files, manifest, sketch_key, sketch_dir) == data_files
+
+
+def test_list_sketch_files_of_a_month_range(tmp_path):
+    sketch_dir = str(tmp_path / "sketches")
+    data_files = [write_month(tmp_path, "2019-0" + str(month) + "_RAMP_subset_page-clicks_v2.csv")
+                  for month in [1, 2, 3]]
+    manifest = load_manifest(str(tmp_path / "manifest.json"))
+    get_stale_sketch_files(data_files, manifest, get_sketch_key(IR_INFO), sketch_dir)
+    sketch_months(data_files, manifest, get_sketch_key(IR_INFO), sketch_dir)
+    # The data files are not needed to list their sketches
+    for data_file in data_files:
+        os.remove(data_file)
+    sketch_files = list_sketch_files(manifest, get_sketch_key(IR_INFO), sketch_dir, "2019-02-01", "2019-03-31")
+    assert sketch_files == [get_sketch_file(f, sketch_dir) for f in data_files[1:]]
+    assert list_sketch_files(manifest, "other key", sketch_dir) == []
+
+
+def test_summarize_ir_clicks_with_given_distinct_counts():
+    ccd_data = pd.DataFrame({"index": ["a_page_clicks", "a_page_clicks"], "url": [1, 2], "clicks": [3, 4],
+                             "position": [1.0, 20.0], "html_url": ["h1", "h1"], "unique_item_uri": ["u1", "u1"]})
+    counts = pd.DataFrame({"countCcdUrls": [5], "countItemUrls": [4], "countItemUris": [3]},
+                          index=pd.Index(["a_page_clicks"], name="index"))
+    stats = summarize_ir_clicks(ccd_data, IR_INFO["ir_page_click_index"], counts)
+    assert stats.loc["a_page_clicks", ["countCcdUrls", "countItemUrls", "countItemUris"]].tolist() == [5, 4, 3]
+    assert stats.loc["b_page_clicks", ["countCcdUrls", "sumCcd"]].tolist() == [0, 0]
+    exact = summarize_ir_clicks(ccd_data, IR_INFO["ir_page_click_index"])
+    assert exact.loc["a_page_clicks", ["countCcdUrls", "countItemUrls", "countItemUris"]].tolist() == [2, 1, 1]
+    pd.testing.assert_frame_equal(stats.drop(columns=list(DISTINCT_COUNT_COLUMNS)),
+                                  exact.drop(columns=list(DISTINCT_COUNT_COLUMNS)))
+
+
+def make_ccd_data(sizes, seed=0):
+    # Each IR gets sizes[ir] distinct URLs, on about a third as many item URLs
+    # and a quarter as many item URIs, with URLs repeated as on several days
+    rng = np.random.default_rng(seed)
+    irs = []
+    for ir, size in sizes.items():
+        urls = rng.integers(0, size, 2 * size)
+        urls[:size] = np.arange(size)
+        irs.append(pd.DataFrame({"index": ir, "url": ["https://" + ir + ".edu/" + str(u) for u in urls],
+                                 "html_url": ["https://" + ir + ".edu/h" + str(u // 3) for u in urls],
+                                 "unique_item_uri": [ir + ".edu/h" + str(u // 4) for u in urls]}))
+    return pd.concat(irs, ignore_index=True)
+
+
+def assert_estimates_close(ccd_data, rel_tol):
+    estimates = estimate_distinct_counts(sketch_distinct_counts(ccd_data))
+    exact = count_distinct_exact(ccd_data)
+    assert estimates.index.tolist() == exact.index.tolist()
+    np.testing.assert_allclose(estimates.to_numpy(), exact.to_numpy(), rtol=rel_tol)
+
+
+def test_small_counts_are_estimated_by_linear_counting():
+    # Well below 2.5 registers per value, linear counting is all but exact
+    assert_estimates_close(make_ccd_data({"a_page_clicks": 2000, "b_page_clicks": 30}), 0.01)
+
+
+def test_large_counts_are_estimated_within_the_standard_error():
+    # The standard error of HyperLogLog is 1.04 / sqrt(2 ** HLL_PRECISION), about 0.8%,
+    # and the estimates are checked within three standard errors
+    assert_estimates_close(make_ccd_data({"a_page_clicks": 300000, "b_page_clicks": 100000}),
+                           3 * 1.04 / np.sqrt(2 ** HLL_PRECISION))
+
+
+def test_merged_month_sketches_equal_the_sketch_of_all_months():
+    ccd_data = make_ccd_data({"a_page_clicks": 50000, "b_page_clicks": 500})
+    shuffled = ccd_data.sample(frac=1, random_state=0)
+    months = [shuffled.iloc[rows] for rows in np.array_split(np.arange(len(shuffled)), 3)]
+    merged = merge_distinct_sketches([sketch_distinct_counts(month) for month in months])
+    whole = sketch_distinct_counts(ccd_data)
+    keys = ["index", "measure", "register"]
+    pd.testing.assert_frame_equal(merged.sort_values(keys).reset_index(drop=True),
+                                  whole.sort_values(keys).reset_index(drop=True), check_dtype=False)
+    pd.testing.assert_frame_equal(estimate_distinct_counts(merged), estimate_distinct_counts(whole))
@@ -0,0 +1,43 @@
+"""Reading the subset of a monthly file for one IR in chunks gives the same
+result as reading the file at once."""
+
+import zipfile
+import pandas as pd
+from aggregation_helpers import extract_subset_ramp_data
+import extract_subset
+
+
+ALL_CSV = """citableContent,clickThrough,clicks,country,date,device,impressions,index,position,url,repository_id
+Yes,0.5,3,usa,2018-01-01,DESKTOP,6,a_page_clicks,1.5,https://a.edu/1.pdf,a
+No,0.1,2,can,2018-01-01,MOBILE,20,b_page_clicks,2.0,https://b.edu/2.pdf,b
+Yes,0.2,4,gbr,2018-01-02,TABLET,20,a_page_clicks,2.5,https://a.edu/3.pdf,a
+Yes,0.3,1,fra,2018-01-02,MOBILE,3,c_page_clicks,3.0,https://c.edu/4.pdf,c
+No,0.4,5,deu,2018-01-03,DESKTOP,12,a_page_clicks,4.0,https://a.edu/5.pdf,a
+"""
+
+
+def test_chunked_subset_keeps_categories(tmp_path):
+    zip_file = str(tmp_path / "2018-01_RAMP_all.zip")
+    with zipfile.ZipFile(zip_file, "w") as z:
+        z.writestr("2018-01_RAMP_all.csv", ALL_CSV)
+    whole = extract_subset_ramp_data(zip_file, "a")
+    chunked = extract_subset_ramp_data(zip_file, "a", chunksize=2)
+    for col in ["repository_id", "index", "country", "device", "citableContent"]:
+        assert isinstance(chunked[col].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(chunked, whole)
+    missing = extract_subset_ramp_data(zip_file, "z", chunksize=2)
+    assert len(missing) == 0 and isinstance(missing["repository_id"].dtype, pd.CategoricalDtype)
+
+
+def test_get_ir_data_concatenates_months(tmp_path):
+    zip_files = []
+    for month in ["2018-01", "2018-02"]:
+        zip_file = str(tmp_path / (month + "_RAMP_all.zip"))
+        with zipfile.ZipFile(zip_file, "w") as z:
+            z.writestr(month + "_RAMP_all.csv", ALL_CSV.replace("2018-01", month))
+        zip_files.append(zip_file)
+    ir_data = extract_subset.get_ir_data("a", [], zip_files, chunksize=2)
+    assert ir_data["date"].tolist() == ["2018-01-01", "2018-01-02", "2018-01-03",
+                                        "2018-02-01", "2018-02-02", "2018-02-03"]
+    cols = ["clicks", "date", "repository_id"]
+    assert extract_subset.get_ir_data("a", cols, []).columns.tolist() == cols
@@ -0,0 +1,63 @@
+"""Conformance test of the column-wise make_*_item_urls functions against the
+scalar make_* functions they replace in construct_html_urls, on the URL corpus
+in data/ramp_urls.csv and on random URLs.
+
+The corpus is synthetic. The RAMP data are not part of the repository, so
+instead of real content file URLs it holds URLs of the shapes each platform
+gives its content files, on made-up hosts ir0.edu to ir4.edu, and hand-written
+edge cases such as upper-case schemes, ";params", queries, fragments, ports,
+credentials, missing parts and blank URLs."""
+
+import os
+import random
+import pandas as pd
+import pytest
+from ramp_summary_helpers import *
+
+URL_CORPUS_FILE = os.path.join(os.path.dirname(__file__), "data", "ramp_urls.csv")
+
+# The column-wise builder, and the scalar functions giving its 'html_url' and 'unique_item_uri'
+BUILDERS = [(make_dspace_item_urls, make_dspace_html_url, make_dspace_item_uri),
+            (make_eprints_fedora_item_urls, make_eprints_fedora_html_url, make_eprints_fedora_item_uri),
+            (make_fedora_ne_item_urls, make_fedora_ne_html_url, make_fedora_ne_item_uri),
+            (make_bepress_item_urls, make_bepress_oai_url, make_bepress_item_uri)]
+
+
+def read_url_corpus():
+    return pd.read_csv(URL_CORPUS_FILE, keep_default_na=False)["url"]
+
+
+def make_random_urls(count, seed=0):
+    """Random strings over the characters the URL patterns look for, half of them
+    with a valid scheme and network location."""
+    rng = random.Random(seed)
+    alphabet = "htps:/.;?#&=0123456789aexmluijspdcneu:_-HT \t"
+    urls = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40))) for _ in range(count // 2)]
+    urls += ["http://x.edu" + "".join(rng.choice("/0123456789.;?#abc") for _ in range(rng.randint(0, 30)))
+             for _ in range(count - count // 2)]
+    return pd.Series(urls)
+
+
+def missing_to_none(value):
+    return None if pd.isna(value) else value
+
+
+@pytest.mark.parametrize("builder, make_html_url, make_item_uri", BUILDERS)
+@pytest.mark.parametrize("urls", [read_url_corpus(), make_random_urls(4000)], ids=["corpus", "random"])
+def test_item_urls_match_scalar_functions(urls, builder, make_html_url, make_item_uri):
+    item_urls = builder(urls)
+    assert item_urls.index.equals(urls.index)
+    for url, html_url, item_uri in zip(urls, item_urls["html_url"], item_urls["unique_item_uri"]):
+        try:
+            expected = (make_html_url(url), make_item_uri(url))
+        except ValueError:
+            # urlparse rejects unbalanced brackets in the network location
+            continue
+        assert (missing_to_none(html_url), missing_to_none(item_uri)) == expected, url
+
+
+def test_item_urls_of_unbalanced_brackets():
+    # Where urlparse raises ValueError, the builders parse the URL as written
+    item_urls = make_dspace_item_urls(pd.Series(["http://[x.edu/handle/1/23", "http://x.edu]/1/23"]))
+    assert item_urls["html_url"].tolist() == ["http://[x.edu/handle/1/23", "http://x.edu]/handle/1/23"]
+    assert item_urls["unique_item_uri"].tolist() == ["/1/23", "/1/23"]
@@ -0,0 +1,65 @@
+"""Cold, warm and platform-change lookups of item URLs in the SQLite index of
+lookup_item_urls."""
+
+import sqlite3
+from contextlib import closing
+import pandas as pd
+import ramp_summary_helpers
+from ramp_summary_helpers import lookup_item_urls, make_dspace_item_urls, make_bepress_item_urls
+
+
+URLS = pd.Series(["https://a.edu/bitstream/handle/1/2/a.pdf",
+                  "http://a.edu/bitstream/handle/1/2/b.pdf?sequence=1",
+                  "https://a.edu/bitstream/handle/1/3/c.pdf",
+                  "https://a.edu/other/d.pdf"])
+
+
+def read_index(index_file):
+    with closing(sqlite3.connect(index_file)) as conn:
+        return pd.read_sql_query("SELECT * FROM item_urls ORDER BY url", conn)
+
+
+def count_builds(monkeypatch, platform):
+    built = []
+    make_item_urls = ramp_summary_helpers.ITEM_URL_BUILDERS[platform]
+    monkeypatch.setitem(ramp_summary_helpers.ITEM_URL_BUILDERS, platform,
+                        lambda urls: built.extend(urls) or make_item_urls(urls))
+    return built
+
+
+def assert_item_urls_equal(item_urls, expected):
+    pd.testing.assert_frame_equal(item_urls.astype(object).where(item_urls.notna(), None),
+                                  expected.astype(object).where(expected.notna(), None))
+
+
+def test_cold_lookup_builds_and_indexes_item_urls(tmp_path):
+    index_file = str(tmp_path / "index.sqlite")
+    item_urls = lookup_item_urls(URLS, "DSpace", index_file)
+    assert_item_urls_equal(item_urls, make_dspace_item_urls(URLS))
+    index = read_index(index_file)
+    assert index["url"].tolist() == sorted(URLS)
+    assert set(index["platform"]) == {"DSpace"}
+
+
+def test_warm_lookup_builds_only_new_urls(tmp_path, monkeypatch):
+    index_file = str(tmp_path / "index.sqlite")
+    lookup_item_urls(URLS[:2], "DSpace", index_file)
+    built = count_builds(monkeypatch, "DSpace")
+    item_urls = lookup_item_urls(URLS[::-1].reset_index(drop=True), "DSpace", index_file)
+    assert sorted(built) == sorted(URLS[2:])
+    assert_item_urls_equal(item_urls, make_dspace_item_urls(URLS[::-1].reset_index(drop=True)))
+    built.clear()
+    assert_item_urls_equal(lookup_item_urls(URLS, "DSpace", index_file), make_dspace_item_urls(URLS))
+    assert built == []
+
+
+def test_platform_change_rebuilds_item_urls(tmp_path, monkeypatch):
+    index_file = str(tmp_path / "index.sqlite")
+    lookup_item_urls(URLS, "DSpace", index_file)
+    built = count_builds(monkeypatch, "Digital Commons")
+    item_urls = lookup_item_urls(URLS, "Digital Commons", index_file)
+    assert sorted(built) == sorted(URLS)
+    assert_item_urls_equal(item_urls, make_bepress_item_urls(URLS))
+    index = read_index(index_file)
+    assert len(index) == len(URLS)
+    assert set(index["platform"]) == {"Digital Commons"}
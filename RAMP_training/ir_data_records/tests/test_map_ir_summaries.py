@@ -0,0 +1,73 @@
+"""Tests of the per-IR work units of RAMP-Summary.py."""
+
+import pandas as pd
+import pytest
+from aggregation_helpers import encode_urls
+from ramp_summary_helpers import *
+
+
+def make_ir_record(ir, platform="DSpace"):
+    return {"ir_index_root": ir, "ir_page_click_index": ir + "_page_clicks", "ir_access_info_index": ir + "_access_info",
+            "Institution": "Inst " + ir, "Repository Name": "Repo " + ir, "URL": "https://" + ir,
+            "Items in repository on 2019-05-27": 10, "Platform": platform, "Country": "US", "Type": "univ",
+            "Normalized_Platform": platform, "Item Count Method": "x", "ETD on 2019-06-07": ".",
+            "GS site operator 2019-06-07": 1}
+
+
+def make_units(ir_records):
+    ccd_data = pd.DataFrame({"index": [r["ir_page_click_index"] for r in ir_records], "url": range(len(ir_records)),
+                             "clicks": 1})
+    ir_stats = pd.DataFrame({"countItemUris": 1, "sumCcd": 1}, index=ccd_data["index"])
+    urls = pd.Series(["https://a.edu/1/%d" % i for i in range(len(ir_records))])
+    return iter_ir_units(ir_records, ir_stats, ccd_data, urls)
+
+
+def count_pulled(units, pulled):
+    for unit in units:
+        pulled.append(unit[0]["ir_index_root"])
+        yield unit
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_units_are_taken_as_they_are_run(tmp_path, workers):
+    ir_records = [make_ir_record("ir%d" % i) for i in range(10)]
+    ir_records[3] = make_ir_record("ir3", platform="Unknown")
+    pulled = []
+    results = map_ir_summaries(count_pulled(make_units(ir_records), pulled), str(tmp_path) + "/", workers)
+    row, error = next(results)
+    assert row["ir"] == "ir0" and error is None
+    assert len(pulled) <= 2 * (workers or 1)
+    rows = [(row, error)] + list(results)
+    assert [r["ir"] for r, e in rows if e is None] == ["ir%d" % i for i in range(10) if i != 3]
+    assert isinstance(rows[3][1], ValueError)
+    assert pd.read_csv(tmp_path / "ir5_ramp_data.csv")["url"].tolist() == ["https://a.edu/1/5"]
+
+
+CCD_URLS = ["https://a.edu/xmlui/bitstream/handle/1/23/f.pdf", "http://a.edu/xmlui/bitstream/handle/1/23/f.pdf",
+            "https://a.edu/xmlui/bitstream/handle/1/45/g.pdf", "https://b.ac.uk/12/1/paper.pdf",
+            "https://b.ac.uk/12/1/paper2.pdf", "https://c.edu/cgi/viewcontent.cgi?article=1001&context=ctx"]
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_ir_stats_computed_per_ir_match_one_pass(tmp_path, workers):
+    ir_records = [make_ir_record("a"), make_ir_record("b", "EPrints 3"), make_ir_record("c", "Digital Commons"),
+                  make_ir_record("d", "Fedora")]
+    ccd_data = pd.DataFrame({"index": ["a_page_clicks"] * 4 + ["b_page_clicks"] * 3 + ["c_page_clicks"],
+                             "url": [0, 1, 2, 0, 3, 4, 3, 5], "clicks": [1, 2, 3, 4, 5, 6, 7, 8],
+                             "position": [1.0, 11.0, 5.0, 1001.0, 2.0, 3.0, 4.0, 9.0]})
+    urls = pd.Series(CCD_URLS).iloc[ccd_data["url"]].reset_index(drop=True)
+    ccd_data["url"], url_dictionary = encode_urls(urls, pd.Index([]))
+    ir_platforms = pd.Series({r["ir_page_click_index"]: r["Platform"] for r in ir_records})
+    pc_indexes = [r["ir_page_click_index"] for r in ir_records]
+    one_pass_data = add_item_urls(ccd_data.copy(), urls, ir_platforms)
+    ir_stats = summarize_ir_clicks(one_pass_data, pc_indexes)
+    one_pass = list(map_ir_summaries(iter_ir_units(ir_records, ir_stats, one_pass_data, urls),
+                                     str(tmp_path) + "/"))
+    one_pass_files = {r["ir_index_root"]: (tmp_path / (r["ir_index_root"] + "_ramp_data.csv")).read_text()
+                      for r in ir_records}
+    per_ir = list(map_ir_summaries(iter_ir_units(ir_records, None, ccd_data, urls), str(tmp_path) + "/", workers))
+    # The describe statistics of IR with a single URL or item are missing
+    pd.testing.assert_frame_equal(pd.DataFrame([row for row, e in per_ir]), pd.DataFrame([row for row, e in one_pass]))
+    assert [e for row, e in per_ir] == [None] * 4
+    assert {ir: (tmp_path / (ir + "_ramp_data.csv")).read_text() for ir in one_pass_files} == one_pass_files
+    assert one_pass[0][0]["countItemUris"] == 2 and one_pass[3][0]["countCcdUrls"] == 0
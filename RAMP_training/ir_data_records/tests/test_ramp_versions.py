@@ -0,0 +1,37 @@
+"""Projecting RAMP v1 data onto the v2 columns without duplicating it."""
+
+import contextlib
+import numpy as np
+import pandas as pd
+from aggregation_helpers import project_ramp_versions, concat_ramp_versions
+
+
+def make_versions():
+    v1_data = pd.DataFrame({"clicks": [1, 2], "country": ["usa", "can"], "date": ["2018-01-01", "2018-01-02"],
+                            "device": ["MOBILE", "DESKTOP"], "url": ["u1", "u2"]})
+    v2_pc_data = pd.DataFrame({"clicks": [3], "date": ["2019-01-01"], "url": ["u3"]})
+    v2_ai_data = pd.DataFrame({"clicks": [4], "country": ["gbr"], "date": ["2019-01-01"], "device": ["TABLET"]})
+    return v1_data, v2_pc_data, v2_ai_data
+
+
+def test_parts_concatenate_to_concat_ramp_versions():
+    v1_data, v2_pc_data, v2_ai_data = make_versions()
+    for v2_data in [v2_pc_data, v2_ai_data]:
+        parts = project_ramp_versions(v1_data, v2_data)
+        assert list(parts[0].columns) == list(v2_data.columns)
+        pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), concat_ramp_versions(v1_data, v2_data))
+
+
+def copy_on_write():
+    # Copy-on-write is always on from pandas 3.0 and an option in pandas 2.x
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return contextlib.nullcontext()
+    return pd.option_context("mode.copy_on_write", True)
+
+
+def test_projections_share_v1_data_with_copy_on_write():
+    v1_data, v2_pc_data, v2_ai_data = make_versions()
+    with copy_on_write():
+        pc_parts = project_ramp_versions(v1_data, v2_pc_data)
+        ai_parts = project_ramp_versions(v1_data, v2_ai_data)
+        assert np.shares_memory(pc_parts[0]["clicks"].to_numpy(), ai_parts[0]["clicks"].to_numpy())
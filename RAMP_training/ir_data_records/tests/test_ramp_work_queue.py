@@ -0,0 +1,108 @@
+"""Retrying failed work units, running requeued units and keeping claims in
+ramp_work_queue."""
+
+import os
+import json
+import time
+import threading
+import zipfile
+import pandas as pd
+import ramp_work_queue
+from ramp_work_queue import submit_work, claim_work, run_work, run_worker, requeue_stale_claims, collect_work
+
+
+PC_CSV = """citableContent,clickThrough,clicks,date,impressions,index,position,url,repository_id
+Yes,0.5,3,2019-01-01,6,a_page_clicks,1.5,https://a.edu/1.pdf,a
+No,0.1,2,2019-01-02,20,a_page_clicks,2.0,https://a.edu/2.pdf,a
+"""
+
+
+def write_zip(zip_file):
+    with zipfile.ZipFile(zip_file, "w") as z:
+        z.writestr(os.path.basename(zip_file).replace(".zip", ".csv"), PC_CSV)
+
+
+def test_failed_unit_is_retried_on_resubmit(tmp_path):
+    queue_dir = str(tmp_path / "queue")
+    zip_file = str(tmp_path / "2019-01_RAMP_all_page-clicks.zip")
+    units = submit_work(queue_dir, "extract_daily_pc_clicks", [zip_file])
+    assert run_worker(queue_dir) == 1
+    assert os.listdir(os.path.join(queue_dir, "failed")) == [units[0] + ".json"]
+    write_zip(zip_file)
+    assert submit_work(queue_dir, "extract_daily_pc_clicks", [zip_file]) == units
+    assert os.listdir(os.path.join(queue_dir, "todo")) == [units[0] + ".json"]
+    assert os.listdir(os.path.join(queue_dir, "failed")) == []
+    run_worker(queue_dir)
+    assert collect_work(queue_dir, units, poll_interval=0)[0]["clicks"].tolist() == [3, 2]
+
+
+def test_waiting_worker_runs_requeued_unit(tmp_path):
+    queue_dir = str(tmp_path / "queue")
+    zip_file = str(tmp_path / "2019-01_RAMP_all_page-clicks.zip")
+    write_zip(zip_file)
+    units = submit_work(queue_dir, "extract_daily_pc_clicks", [zip_file])
+    # A worker claims the unit and goes down, then the claim is requeued
+    # while a waiting worker is polling the empty queue
+    unit = claim_work(queue_dir)
+    worker = threading.Thread(target=run_worker, args=(queue_dir,), kwargs={"wait": 2, "poll_interval": 0.05})
+    worker.start()
+    assert requeue_stale_claims(queue_dir, max_age=0) == [unit]
+    partials = collect_work(queue_dir, units, poll_interval=0.05)
+    assert partials[0]["clicks"].tolist() == [3, 2]
+    worker.join()
+
+
+def slow_clicks(zip_file, seconds):
+    time.sleep(seconds)
+    return pd.DataFrame({"date": ["2019-01-01"], "clicks": [1]})
+
+
+def take_over_claim(zip_file, shared_dir):
+    # The claim is requeued while this worker runs the unit, and another worker claims it
+    unit = claim_work(shared_dir) if requeue_stale_claims(shared_dir, max_age=0) else None
+    claim_file = os.path.join(shared_dir, "claimed", unit + ".json")
+    with open(claim_file) as f:
+        task = json.load(f)
+    task["worker"] = "otherhost:1"
+    with open(claim_file, "w") as f:
+        json.dump(task, f)
+    raise ValueError("fails after the claim was lost")
+
+
+def test_running_unit_keeps_its_claim(tmp_path, monkeypatch):
+    queue_dir = str(tmp_path / "queue")
+    monkeypatch.setitem(ramp_work_queue.WORK_FUNCTIONS, "slow_clicks", slow_clicks)
+    units = submit_work(queue_dir, "slow_clicks", ["2019-01_RAMP_all.zip"], seconds=1.5)
+    requeued = []
+    coordinator = threading.Thread(target=lambda: [requeued.extend(requeue_stale_claims(queue_dir, max_age=0.5))
+                                                   or time.sleep(0.1) for _ in range(15)])
+    assert claim_work(queue_dir) == units[0]
+    coordinator.start()
+    assert run_work(queue_dir, units[0], heartbeat=0.1)
+    coordinator.join()
+    assert requeued == []
+    assert os.listdir(os.path.join(queue_dir, "done")) == [units[0] + ".json"]
+    assert sorted(os.listdir(os.path.join(queue_dir, "claimed"))) == [units[0] + ".csv"]
+
+
+def test_lost_claim_is_left_to_the_new_worker(tmp_path, monkeypatch):
+    queue_dir = str(tmp_path / "queue")
+    monkeypatch.setitem(ramp_work_queue.WORK_FUNCTIONS, "take_over_claim", take_over_claim)
+    units = submit_work(queue_dir, "take_over_claim", ["2019-01_RAMP_all.zip"], shared_dir=queue_dir)
+    assert claim_work(queue_dir) == units[0]
+    assert run_work(queue_dir, units[0]) is None
+    assert os.listdir(os.path.join(queue_dir, "failed")) == []
+    assert os.listdir(os.path.join(queue_dir, "done")) == []
+    with open(os.path.join(queue_dir, "claimed", units[0] + ".json")) as f:
+        assert json.load(f)["worker"] == "otherhost:1"
+
+
+def test_claim_requeued_before_the_unit_starts(tmp_path):
+    queue_dir = str(tmp_path / "queue")
+    zip_file = str(tmp_path / "2019-01_RAMP_all_page-clicks.zip")
+    write_zip(zip_file)
+    units = submit_work(queue_dir, "extract_daily_pc_clicks", [zip_file])
+    assert claim_work(queue_dir) == units[0]
+    assert requeue_stale_claims(queue_dir, max_age=0) == units
+    assert run_work(queue_dir, units[0]) is None
+    assert os.listdir(os.path.join(queue_dir, "todo")) == [units[0] + ".json"]
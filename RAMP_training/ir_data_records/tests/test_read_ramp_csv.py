@@ -0,0 +1,42 @@
+"""The pyarrow engine of read_ramp_csv must read RAMP CSVs, including their
+missing values, the same way as the pandas parser."""
+
+import io
+import zipfile
+import pandas as pd
+from aggregation_helpers import read_ramp_csv, extract_daily_ai_clicks
+
+
+# Access info rows with blank, "NA" and "null" countries and devices
+AI_CSV = """clickThrough,clicks,country,date,device,impressions,index,position,repository_id
+0.5,3,usa,2019-01-01,DESKTOP,6,a_access_info,1.5,a
+0.1,2,,2019-01-01,DESKTOP,20,a_access_info,2.0,a
+0.2,4,NA,2019-01-01,,20,a_access_info,2.5,a
+0.3,1,can,2019-01-02,MOBILE,3,a_access_info,3.0,
+0.4,5,usa,2019-01-02,null,12,a_access_info,4.0,a
+0.6,7,usa,2019-01-02,DESKTOP,12,a_access_info,4.0,a
+"""
+
+
+def write_zip(path, csv_text):
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr(path.name.replace(".zip", ".csv"), csv_text)
+    return str(path)
+
+
+def test_engines_read_missing_values_alike():
+    pandas_df = read_ramp_csv(io.StringIO(AI_CSV), "country-device-info")
+    arrow_df = read_ramp_csv(io.BytesIO(AI_CSV.encode()), "country-device-info", engine="pyarrow")
+    assert pandas_df["country"].isna().tolist() == [False, True, True, False, False, False]
+    assert pandas_df["device"].isna().tolist() == [False, False, True, False, True, False]
+    pd.testing.assert_frame_equal(arrow_df, pandas_df, check_dtype=False, check_categorical=False)
+
+
+def test_engines_sum_daily_ai_clicks_alike(tmp_path):
+    zip_file = write_zip(tmp_path / "2019-01_RAMP_all_country-device-info.zip", AI_CSV)
+    pandas_clicks = extract_daily_ai_clicks(zip_file)
+    arrow_clicks = extract_daily_ai_clicks(zip_file, engine="pyarrow")
+    # Rows with a missing country or device are not summed
+    assert len(pandas_clicks) == 3
+    # The date resolution of the pandas parser depends on the pandas version
+    pd.testing.assert_frame_equal(arrow_clicks, pandas_clicks, check_dtype=False)
@@ -0,0 +1,74 @@
+"""Regression test of the daily clicksums of sum_clicks_by against the per-group
+loops it replaced, which are kept here as the reference."""
+
+import zipfile
+import numpy as np
+import pandas as pd
+from aggregation_helpers import sum_clicks_by, extract_daily_pc_clicks, extract_daily_ai_clicks, \
+    read_ramp_csv
+
+
+def previous_daily_pc_clicks(ramp_df):
+    # extract_daily_pc_clicks before sum_clicks_by
+    daily_rows = []
+    for name, group in ramp_df.groupby("date"):
+        daily_rows.append([name, group["clicks"].sum()])
+    daily_clicks = pd.DataFrame(daily_rows, columns=["date", "clicks"])
+    daily_clicks["date"] = pd.to_datetime(daily_clicks["date"])
+    return daily_clicks
+
+
+def previous_daily_ai_clicks(ramp_df):
+    # extract_daily_ai_clicks before sum_clicks_by
+    daily_rows = []
+    for name, group in ramp_df.groupby(["date", "country", "device"], observed=True):
+        daily_rows.append([name[0], name[1], name[2], group["clicks"].sum()])
+    daily_clicks = pd.DataFrame(daily_rows, columns=["date", "country", "device", "clicks"])
+    daily_clicks["date"] = pd.to_datetime(daily_clicks["date"])
+    return daily_clicks
+
+
+def make_month(rows, seed=0):
+    """A month of RAMP "all" data with random dates, countries, devices and clicks,
+    and some missing countries."""
+    rng = np.random.default_rng(seed)
+    countries = np.array(["usa", "can", "gbr", "fra", "deu", "ind", ""], dtype=object)
+    return pd.DataFrame({
+        "citableContent": rng.choice(["Yes", "No"], rows),
+        "clickThrough": rng.random(rows).round(3),
+        "clicks": rng.integers(0, 10, rows),
+        "country": rng.choice(countries, rows),
+        "date": pd.to_datetime("2018-01-01") + pd.to_timedelta(rng.integers(0, 31, rows), unit="D"),
+        "device": rng.choice(["DESKTOP", "MOBILE", "TABLET"], rows),
+        "impressions": rng.integers(1, 100, rows),
+        "index": rng.choice(["a_page_clicks", "b_page_clicks"], rows),
+        "position": rng.uniform(1, 100, rows).round(1),
+        "url": ["https://a.edu/%d.pdf" % i for i in rng.integers(0, 500, rows)],
+        "repository_id": rng.choice(["a", "b"], rows)})
+
+
+def write_month(tmp_path, ramp_df):
+    zip_file = str(tmp_path / "2018-01_RAMP_all.zip")
+    with zipfile.ZipFile(zip_file, "w") as z:
+        z.writestr("2018-01_RAMP_all.csv", ramp_df.to_csv(index=False, date_format="%Y-%m-%d"))
+    return zip_file
+
+
+def test_daily_clicks_match_previous_loops(tmp_path):
+    zip_file = write_month(tmp_path, make_month(5000))
+    with zipfile.ZipFile(zip_file) as z, z.open("2018-01_RAMP_all.csv") as f:
+        ramp_df = read_ramp_csv(f, "all")
+    pd.testing.assert_frame_equal(extract_daily_pc_clicks(zip_file), previous_daily_pc_clicks(ramp_df),
+                                  check_dtype=False)
+    pd.testing.assert_frame_equal(extract_daily_ai_clicks(zip_file), previous_daily_ai_clicks(ramp_df),
+                                  check_dtype=False)
+
+
+def test_sum_clicks_by_returns_plain_int64_sums():
+    ramp_df = pd.DataFrame({"country": pd.Categorical(["usa", "can", "usa", None], categories=["can", "gbr", "usa"]),
+                            "clicks": np.array([1, 2, 3, 4], dtype="int32")})
+    clicks = sum_clicks_by(ramp_df, ["country"])
+    assert clicks["country"].tolist() == ["can", "usa"]
+    assert clicks["clicks"].tolist() == [2, 4]
+    assert clicks["clicks"].dtype == "int64"
+    assert not isinstance(clicks["country"].dtype, pd.CategoricalDtype)